@@ -1,12 +1,13 @@
 import json
 
 from django.contrib.admin.views.decorators import staff_member_required
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.contrib.auth import authenticate, login
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse
 from django.utils.translation import gettext as _
 
+from .cache import get_etag, get_or_build, get_page_tree_version, get_scoped_key
 from .models import Page
 
 
@@ -61,13 +62,21 @@ def page_move_down(request, id):
     return HttpResponseRedirect(reverse('admin:fiber_page_changelist'))
 
 
+def get_pages_json_key(request):
+    # Shares the cached data with the full page tree of the api
+    return get_scoped_key('pagetree', request.user, [get_page_tree_version(), []])
+
+
 @staff_member_required
+@condition(etag_func=lambda request: get_etag(get_pages_json_key(request)))
 def pages_json(request):
     """
     Returns page tree as json. The data is suitable for jqtree.
+
+    The data is cached until a page changes. Requests with a matching `If-None-Match` header get a 304 response.
     """
     return HttpResponse(
         json.dumps(
-            Page.objects.create_jqtree_data(request.user)
+            get_or_build(get_pages_json_key(request), lambda: Page.objects.create_jqtree_data(request.user))
         )
     )
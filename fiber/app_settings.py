@@ -21,6 +21,33 @@ CONTENT_ITEM_MANAGER = getattr(settings, 'FIBER_CONTENT_ITEM_MANAGER', 'fiber.ma
 
 AUTO_CREATE_CONTENT_ITEMS = getattr(settings, 'FIBER_AUTO_CREATE_CONTENT_ITEMS', False)
 
+# Version counters and cached data are stored in this cache. Multi-process deployments need a shared backend.
+CACHE_ALIAS = getattr(settings, 'FIBER_CACHE_ALIAS', 'default')
+# Keep per-process copies of page tree data (e.g. the url index), rebuilt whenever the page tree version changes.
+LOCAL_CACHE = getattr(settings, 'FIBER_LOCAL_CACHE', False)
+# Cache the rendered output of content items that have a template, until the content item is saved.
+CONTENT_ITEM_CACHE = getattr(settings, 'FIBER_CONTENT_ITEM_CACHE', False)
+# Number of rendered markup texts to remember per process, so unchanged markup isn't rendered again.
+MARKUP_CACHE_SIZE = getattr(settings, 'FIBER_MARKUP_CACHE_SIZE', 100)
+# Also store rendered markup in the Fiber cache, so it's shared between processes and restarts.
+MARKUP_CACHE = getattr(settings, 'FIBER_MARKUP_CACHE', False)
+# Cache the html of rendered menus. Cached menus are invalidated when any page changes.
+MENU_CACHE = getattr(settings, 'FIBER_MENU_CACHE', False)
+# Number of urls without a page to remember per process, so repeated requests for them don't query the database.
+MISSING_URL_CACHE_SIZE = getattr(settings, 'FIBER_MISSING_URL_CACHE_SIZE', 0)
+# Cache the responses of FiberTemplateView for anonymous users, until the pages or the content they show change.
+PAGE_CACHE = getattr(settings, 'FIBER_PAGE_CACHE', False)
+# Number of seconds that responses are kept in the page cache.
+PAGE_CACHE_TIMEOUT = getattr(settings, 'FIBER_PAGE_CACHE_TIMEOUT', 300)
+# Add ETag and Last-Modified headers to pages for anonymous users, and answer conditional requests with 304.
+CONDITIONAL_PAGES = getattr(settings, 'FIBER_CONDITIONAL_PAGES', False)
+# Dotted paths to callables that are called with the urls of the pages that changed, see fiber.purge.
+PURGE_SINKS = getattr(settings, 'FIBER_PURGE_SINKS', [])
+# The file that the fiber.purge.write_json_lines sink appends to.
+PURGE_FILE = getattr(settings, 'FIBER_PURGE_FILE', 'fiber_purge.jsonl')
+# Number of obfuscated email addresses to remember per process. If set, every address is always encoded the same way.
+OBFUSCATED_EMAIL_CACHE_SIZE = getattr(settings, 'FIBER_OBFUSCATED_EMAIL_CACHE_SIZE', 0)
+
 METADATA_PAGE_SCHEMA = getattr(settings, 'FIBER_METADATA_PAGE_SCHEMA', {})
 METADATA_CONTENT_SCHEMA = getattr(settings, 'FIBER_METADATA_CONTENT_SCHEMA', {})
 
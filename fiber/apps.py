@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FiberConfig(AppConfig):
     name = 'fiber'
     default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        # Connect the signal receivers
+        from . import signals
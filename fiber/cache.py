@@ -0,0 +1,260 @@
+"""
+Version counters and per-process caches.
+
+Every write to a Page bumps the page tree version, and every write to a ContentItem or PageContentItem bumps the
+content version. Writes that change what a content item or the content blocks of a page look like also bump the
+version of that content item or page, so cached pages that show it can be recognized. The versions are stored in the
+cache configured by `FIBER_CACHE_ALIAS`. Per-process copies of data derived from the page tree are stamped with the
+version they were built from, and are rebuilt as soon as that version changes.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_cache_key, learn_cache_key
+
+from .app_settings import CACHE_ALIAS, PERMISSION_CLASS
+from .utils.import_util import load_class
+
+PAGE_TREE_VERSION_KEY = 'fiber:page_tree_version'
+PAGE_TREE_MODIFIED_KEY = 'fiber:page_tree_modified'
+CONTENT_VERSION_KEY = 'fiber:content_version'
+CONTENT_MODIFIED_KEY = 'fiber:content_modified'
+PAGE_CACHE_KEY_PREFIX = 'fiber:page'
+
+_local_cache = {}
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _new_version():
+    # Start from the current time, so a version never repeats after the cache has been cleared
+    return int(time.time() * 1000000)
+
+
+def get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    def bump():
+        cache = get_cache()
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+    bump()
+    # Bump again once the transaction is committed, so other processes can't keep data they built from the
+    # database state before the commit.
+    transaction.on_commit(bump)
+
+
+def get_page_tree_version():
+    return get_version(PAGE_TREE_VERSION_KEY)
+
+
+def bump_page_tree_version():
+    bump_version(PAGE_TREE_VERSION_KEY)
+    set_modified(PAGE_TREE_MODIFIED_KEY)
+
+
+def set_modified(key):
+    """
+    Record the current time under `key`, as the time at which the data it belongs to was last modified.
+    """
+    def set_now():
+        get_cache().set(key, time.time(), None)
+
+    set_now()
+    transaction.on_commit(set_now)
+
+
+def get_modified(keys):
+    """
+    Return the latest of the times recorded under `keys` by `set_modified`, as a timestamp. An unknown time, e.g. after
+    the cache was cleared, counts as now.
+    """
+    cache = get_cache()
+    times = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in times:
+            cache.add(key, now, None)
+            times[key] = cache.get(key, now)
+    return max(times.values())
+
+
+def get_content_version():
+    return get_version(CONTENT_VERSION_KEY)
+
+
+def bump_content_version(content_item_ids=(), page_ids=(), names=()):
+    """
+    Bump the content version, and the versions of the given content items, of the content blocks of the given pages
+    and of the given content item names.
+    """
+    bump_version(CONTENT_VERSION_KEY)
+    set_modified(CONTENT_MODIFIED_KEY)
+    for content_item_id in content_item_ids:
+        bump_version(get_content_item_version_key(content_item_id))
+    for page_id in page_ids:
+        bump_version(get_page_content_version_key(page_id))
+    for name in names:
+        bump_version(get_content_name_version_key(name))
+
+
+def get_content_item_version_key(content_item_id):
+    return 'fiber:content_item_version:%s' % content_item_id
+
+
+def get_page_content_version_key(page_id):
+    return 'fiber:page_content_version:%s' % page_id
+
+
+def get_content_name_version_key(name):
+    # Changes when a content item with this name is created, e.g. for `show_content` tags of missing content items
+    return 'fiber:content_name_version:%s' % hashlib.md5(name.encode()).hexdigest()
+
+
+def get_versions(keys):
+    """
+    Return a dict that maps the given version keys to their versions, retrieved from the cache at once.
+    """
+    versions = get_cache().get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = get_version(key)
+    return versions
+
+
+def add_dependencies(request, keys):
+    """
+    Record that the response to `request` depends on the versions stored under `keys`. Only has an effect while the
+    response is built for the page cache, see `fiber.views.FiberTemplateView`.
+    """
+    dependencies = getattr(request, '_fiber_dependencies', None)
+    if dependencies is not None:
+        dependencies.update(keys)
+
+
+def get_cached_response(request):
+    """
+    Return the cached response to `request`, or None if it isn't cached or depends on a version that has changed
+    since it was cached.
+    """
+    cache = get_cache()
+    key = get_cache_key(request, PAGE_CACHE_KEY_PREFIX, 'GET', cache=cache)
+    cached = cache.get(key) if key else None
+    if cached is None:
+        return None
+    response, versions = cached
+    if get_versions(list(versions)) != versions:
+        return None
+    return response
+
+
+def cache_response(request, response, versions, timeout):
+    """
+    Cache the response to `request`, until one of the given versions changes. Like Django's cache middleware, the
+    key depends on the headers named in the Vary header of the response.
+    """
+    cache = get_cache()
+    key = learn_cache_key(request, response, timeout, PAGE_CACHE_KEY_PREFIX, cache=cache)
+    cache.set(key, (response, versions), timeout)
+
+
+def get_scoped_key(name, user, versions):
+    """
+    Return a cache key for data named `name` as seen by `user`, built from the state identified by `versions`.
+    Users in the same permission scope (see `Permissions.get_permission_scope`) share the key.
+    """
+    scope = load_class(PERMISSION_CLASS).get_permission_scope(user)
+    key = json.dumps([name, scope] + list(versions), default=str)
+    return 'fiber:%s:%s' % (name, hashlib.md5(key.encode()).hexdigest())
+
+
+def get_etag(key):
+    """
+    Return an ETag for the data stored under a key from `get_scoped_key`; the key changes whenever the data does.
+    """
+    return key.rsplit(':', 1)[1]
+
+
+def get_or_build(key, build):
+    """
+    Return the value stored under `key` in the Fiber cache, or build and store it.
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value)
+    return value
+
+
+def get_local(name, build):
+    """
+    Return the per-process value stored under `name`. The value is (re)built by calling `build` when the page tree
+    has changed since it was last built.
+    """
+    version = get_page_tree_version()
+    cached = _local_cache.get(name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    value = build()
+    _local_cache[name] = (version, value)
+    return value
+
+
+class LRUCache:
+    """
+    A bounded mapping that discards the least recently used keys. Counts hits and misses, to help sizing it.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
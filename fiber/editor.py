@@ -1,10 +1,38 @@
-from .app_settings import EDITOR
+import hashlib
+
+from .app_settings import EDITOR, MARKUP_CACHE, MARKUP_CACHE_SIZE
+from .cache import LRUCache, get_cache
 from .utils.import_util import import_element
 
 
 editor = import_element(EDITOR)
 renderer = editor.get('renderer', None)
 
+# Rendered html, keyed by a hash of the markup
+rendered_markup = LRUCache(MARKUP_CACHE_SIZE)
+
+
+def render(markup):
+    """
+    Render markup to html with the renderer of the editor.
+
+    The html is remembered per process, and in the Fiber cache if FIBER_MARKUP_CACHE = True, so unchanged markup
+    isn't rendered again.
+    """
+    key = hashlib.sha1(
+        ('%s.%s:%s' % (renderer.__module__, renderer.__qualname__, markup)).encode()).hexdigest()
+    html = rendered_markup.get(key)
+    if html is None:
+        cache_key = 'fiber:markup:%s' % key
+        if MARKUP_CACHE:
+            html = get_cache().get(cache_key)
+        if html is None:
+            html = renderer(markup)
+            if MARKUP_CACHE:
+                get_cache().set(cache_key, html)
+        rendered_markup.set(key, html)
+    return html
+
 
 def get_editor_field_name(html_field_name):
     """
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fiber.models import Page
+
+
+class Command(BaseCommand):
+    help = 'Let pages that redirect to a redirecting page redirect to the last page of the chain.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report redirect chains and loops, and exit with a non-zero status if there are any.',
+        )
+
+    def handle(self, *args, **options):
+        check = options['check']
+        changed_pages, loops = Page.objects.flatten_redirects(commit=not check)
+
+        for page in changed_pages:
+            self.stdout.write(f'{page.id}: {page.title} -> {page.redirect_page_id}')
+        for loop in loops:
+            self.stderr.write(f'Redirect loop: {", ".join(str(page_id) for page_id in sorted(loop))}')
+
+        if check and (changed_pages or loops):
+            raise CommandError(f'{len(changed_pages)} page(s) redirect to a redirecting page, {len(loops)} redirect loop(s).')
+        if check:
+            self.stdout.write('There are no redirect chains.')
+        else:
+            self.stdout.write(f'Updated {len(changed_pages)} page(s).')
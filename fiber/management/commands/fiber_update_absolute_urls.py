@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fiber.models import Page
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored absolute urls of all pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report pages whose stored absolute url is out of date, and exit with a non-zero status if there are any.',
+        )
+
+    def handle(self, *args, **options):
+        check = options['check']
+        changed_pages = Page.objects.update_absolute_urls(commit=not check)
+
+        for page in changed_pages:
+            self.stdout.write(f'{page.id}: {page.title} -> {page.absolute_url}')
+
+        if check and changed_pages:
+            raise CommandError(f'{len(changed_pages)} page(s) have an out of date absolute url.')
+        if check:
+            self.stdout.write('All stored absolute urls are up to date.')
+        else:
+            self.stdout.write(f'Updated {len(changed_pages)} page(s).')
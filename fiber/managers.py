@@ -1,21 +1,93 @@
 import datetime
+import operator
 import re
 
+from functools import reduce
+
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.encoding import force_str
-from django.utils.translation import gettext, gettext_lazy as _
+from django.utils.translation import get_language, gettext, gettext_lazy as _
 
 from mptt.managers import TreeManager
 
-from . import editor
-from .utils.urls import get_named_url_from_quoted_url
+from . import editor, purge
+from .cache import LRUCache, bump_content_version, bump_page_tree_version, get_local, get_page_tree_version
+from .tree import PageTreeSnapshot
+from .utils.html import get_hrefs
+from .utils.urls import get_absolute_page_url, has_named_page_url, is_quoted_url, is_relative_url
 
 from .utils.import_util import load_class
-from .app_settings import PERMISSION_CLASS
+from .app_settings import LOCAL_CACHE, MISSING_URL_CACHE_SIZE, PERMISSION_CLASS
+
+
+def get_change_url_parts(model):
+    """
+    Return the parts of the Fiber admin change url of `model` before and after the object id, so the change urls of
+    many objects can be built without reversing each of them.
+    """
+    opts = model._meta
+    placeholder = '2147483647'
+    change_url = reverse(f'fiber_admin:{opts.app_label}_{opts.object_name.lower()}_change', args=(placeholder, ))
+    return tuple(change_url.split(placeholder, 1))
+
+
+# The fields of a page that menus show, including its position in the tree
+MENU_FIELDS = ('parent_id', 'title', 'url', 'show_in_menu', 'is_public', 'redirect_page_id', 'mark_current_regexes')
 
 
 class ContentItemManager(models.Manager):
 
+    def get_content_group_filters(self):
+        """
+        Return the content groups as (slug, label, filter) tuples, in the order they are shown. The filters apply to
+        the queryset from `get_content_groups_queryset`.
+        """
+        return [
+            ('multiple', _('used more than once'), models.Q(num_pages__gt=1)),
+            ('unused', _('unused'), models.Q(num_pages=0)),
+            ('once', _('used once'), models.Q(num_pages=1)),
+            ('recently_changed', _('recently changed'), models.Q(updated__date=datetime.date.today())),
+        ]
+
+    def get_content_groups_queryset(self, user=None):
+        """
+        Return the content items annotated with `num_pages`, the number of times they are used on pages.
+
+        If `user` is provided the queryset is filtered so only the content items that `user` is allowed to edit are returned.
+        """
+        queryset = self.get_queryset()
+
+        #  Filter queryset through the permissions class
+        if user:
+            queryset = load_class(PERMISSION_CLASS).filter_objects(user, queryset)
+
+        # A subquery instead of an aggregate, so the groups can be counted with conditional aggregation
+        page_content_item_model = self.model._meta.get_field('page_content_items').related_model
+        num_pages = page_content_item_model.objects.filter(content_item=models.OuterRef('pk')).order_by().values(
+            'content_item').annotate(count=models.Count('id')).values('count')
+        # The labels use the stored summary, so the content doesn't need to be retrieved
+        queryset = queryset.defer('content_markup', 'content_html')
+        return queryset.annotate(num_pages=Coalesce(models.Subquery(num_pages), 0))
+
+    def get_content_item_info(self, content_items):
+        """
+        Return the jqtree node data of the given content items.
+        """
+        change_url_start, change_url_end = get_change_url_parts(self.model)
+
+        return [
+            dict(
+                label=force_str(content_item),
+                id=content_item.id,
+                change_url='%s%s%s' % (change_url_start, content_item.id, change_url_end),
+                used_on_pages=content_item.used_on_pages_data
+            )
+            for content_item in content_items
+        ]
+
     def get_content_groups(self, user=None):
         """
         Get content groups data which is suitable for jqtree.
@@ -35,19 +107,8 @@ class ContentItemManager(models.Manager):
 
         today = datetime.date.today()
 
-        queryset = self.get_queryset()
-
-        #  Filter queryset through the permissions class
-        if user:
-            queryset = load_class(PERMISSION_CLASS).filter_objects(user, queryset)
-
-        for content_item in queryset.annotate(num_pages=models.Count('page')):
-            content_item_info = dict(
-                label=force_str(content_item),
-                id=content_item.id,
-                change_url=content_item.get_change_url(),
-                used_on_pages=content_item.used_on_pages_data
-            )
+        content_items = list(self.get_content_groups_queryset(user))
+        for content_item, content_item_info in zip(content_items, self.get_content_item_info(content_items)):
             count = content_item.num_pages
 
             if not count:
@@ -80,47 +141,177 @@ class ContentItemManager(models.Manager):
 
         return result
 
-    def rename_url(self, old_url, new_url):
+    def get_content_group_counts(self, user=None):
         """
-        Change the urls in all content pages. Also changes the urls that begin with this url.
+        Get the content groups without their content items, suitable for a jqtree that loads the content items on
+        demand. The number of content items in each group is counted in one query.
+        """
+        filters = self.get_content_group_filters()
+        counts = self.get_content_groups_queryset(user).aggregate(**{
+            slug: models.Count('id', filter=group_filter) for slug, label, group_filter in filters
+        })
+        return [
+            # Use gettext instead of gettext_lazy because result must be serializable.
+            dict(label=gettext(label), id=slug, count=counts[slug], load_on_demand=True)
+            for slug, label, group_filter in filters if counts[slug]
+        ]
+
+    def get_content_group(self, slug, user=None):
+        """
+        Return the content items in the content group with the given slug. Raises KeyError if there is no such
+        group.
         """
+        group_filter = {slug: group_filter for slug, label, group_filter in self.get_content_group_filters()}[slug]
+        return self.get_content_groups_queryset(user).filter(group_filter).order_by('id')
 
-        def rename_html(html):
-            return re.sub(
-                r"""(\s)href=(["'])%s""" % old_url,
-                r'\1href=\2%s' % new_url,
-                html,
-            )
+    def get_by_names(self, names, create=False):
+        """
+        Retrieve the content items with the given names in one query, and return a dict that maps each name to its
+        content item, or to None if there is no content item with that name.
 
-        def rename_markup(markup):
-            if not 'rename_url_expressions' in editor.editor:
-                return markup
-            else:
-                expressions = editor.editor['rename_url_expressions']
-                return re.sub(
-                    expressions[0] % old_url,
-                    expressions[1] % new_url,
-                    content_item.content_markup,
-                )
+        If `create` is True the missing content items are created, in one query if the database supports it.
+        """
+        content_items = dict.fromkeys(names)
+        for content_item in self.get_queryset().filter(name__in=content_items).order_by('-id'):
+            # Names aren't unique; like `get()` used to, prefer the oldest content item
+            content_items[content_item.name] = content_item
+
+        missing_names = [name for name, content_item in content_items.items() if content_item is None]
+        if create and missing_names:
+            created = self.bulk_create([self.model(name=name) for name in missing_names])
+            bump_content_version(names=missing_names)
+            if any(content_item.pk is None for content_item in created):
+                # The database doesn't return the primary keys of the created rows
+                created = self.get_queryset().filter(name__in=missing_names)
+            for content_item in created:
+                content_items[content_item.name] = content_item
+        return content_items
+
+    def update_used_on_pages(self, content_items):
+        """
+        Recompute `used_on_pages_data` of the given content items. The pages of all content items are retrieved in
+        one query (and the pages with a named url in another), and only the `used_on_pages_data` column is written.
+        """
+        content_items = {content_item.pk: content_item for content_item in content_items}
+        used_on_pages = {content_item_id: [] for content_item_id in content_items}
+
+        page_content_item_model = self.model._meta.get_field('page_content_items').related_model
+        page_content_items = page_content_item_model.objects.filter(content_item__in=list(content_items)).order_by('id')
+        rows = list(page_content_items.values_list(
+            'content_item', 'page', 'page__title', 'page__url', 'page__absolute_url'))
+
+        # Named urls aren't stored (see `has_named_page_url`), they are reversed in the active language
+        named_urls = {}
+        named_page_ids = {
+            page_id for content_item_id, page_id, title, url, absolute_url in rows if url and not absolute_url}
+        if named_page_ids:
+            page_model = page_content_item_model._meta.get_field('page').related_model
+            for page in page_model.objects.filter(pk__in=named_page_ids):
+                named_urls[page.pk] = page.get_absolute_url() or ''
+
+        for content_item_id, page_id, title, url, absolute_url in rows:
+            used_on_pages[content_item_id].append({'title': title, 'url': absolute_url or named_urls.get(page_id, '')})
+
+        for content_item_id, content_item in content_items.items():
+            content_item.used_on_pages_data = used_on_pages[content_item_id]
+        self.bulk_update(content_items.values(), ['used_on_pages_data'], batch_size=1000)
+        bump_content_version()
+
+    def get_page_urls(self, content_item_ids):
+        """
+        Return the absolute urls of the pages that show the given content items in their content blocks.
+        """
+        page_content_item_model = self.model._meta.get_field('page_content_items').related_model
+        page_content_items = page_content_item_model.objects.filter(content_item__in=list(content_item_ids))
+        return set(page_content_items.values_list('page__absolute_url', flat=True))
 
-        queryset = self.get_queryset()
+    def update_links(self, content_items):
+        """
+        Record the urls that the given content items link to, so `rename_url` can find the content items that link
+        to a url.
+        """
+        content_items = list(content_items)
+        link_model = self.model._meta.get_field('links').related_model
+        max_length = link_model._meta.get_field('url').max_length
+
+        existing_links = {}
+        for link_id, content_item_id, url in link_model.objects.filter(content_item__in=content_items).values_list('id', 'content_item', 'url'):
+            existing_links[(content_item_id, url)] = link_id
+        links = {
+            (content_item.pk, url[:max_length])
+            for content_item in content_items
+            for url in get_hrefs(content_item.content_html)
+        }
+
+        removed_link_ids = [link_id for link, link_id in existing_links.items() if link not in links]
+        if removed_link_ids:
+            link_model.objects.filter(id__in=removed_link_ids).delete()
+        link_model.objects.bulk_create(
+            link_model(content_item_id=content_item_id, url=url)
+            for content_item_id, url in sorted(links) if (content_item_id, url) not in existing_links
+        )
+
+    def rename_url(self, old_url, new_url):
+        """
+        Change the urls in all content pages. Also changes the urls that begin with this url.
+        """
+        self.rename_urls({old_url: new_url})
 
-        for content_item in queryset:
-            if editor.renderer:
-                markup = rename_markup(content_item.content_markup)
+    def rename_urls(self, url_map):
+        """
+        Change the urls in all content items in one pass, using `url_map` that maps old urls to new urls. Urls that
+        begin with an old url are changed too; the longest matching old url wins.
 
-                if markup != content_item.content_markup:
-                    content_item.content_markup = markup
-                    content_item.save()
-            else:
-                html = rename_html(content_item.content_html)
+        Only the content items that link to one of the urls are retrieved, and they are saved with a single query.
+        """
+        url_map = {
+            old_url: new_url for old_url, new_url in url_map.items() if old_url and new_url and old_url != new_url}
+        if not url_map:
+            return
 
-                if html != content_item.content_html:
-                    content_item.content_html = html
-                    content_item.save()
+        if editor.renderer:
+            if not 'rename_url_expressions' in editor.editor:
+                return
+            expressions = editor.editor['rename_url_expressions']
+            field_name = 'content_markup'
+        else:
+            expressions = (r"""(\s)href=(["'])%s""", r'\1href=\2%s')
+            field_name = 'content_html'
+
+        old_urls = sorted(url_map, key=len, reverse=True)
+        pattern = re.compile(expressions[0] % ('(?P<fiber_url>%s)' % '|'.join(re.escape(url) for url in old_urls)))
+
+        def replace(match):
+            return match.expand(expressions[1] % url_map[match.group('fiber_url')])
+
+        # Content items that link below an old url are found by the shortest old url they start with
+        prefixes = [url for url in old_urls if not any(url != other and url.startswith(other) for other in old_urls)]
+        linking = reduce(operator.or_, (models.Q(links__url__startswith=prefix) for prefix in prefixes))
+
+        now = timezone.now()
+        changed_content_items = []
+        for content_item in self.get_queryset().filter(linking).distinct():
+            value = getattr(content_item, field_name)
+            new_value = pattern.sub(replace, value)
+            if new_value != value:
+                setattr(content_item, field_name, new_value)
+                if editor.renderer:
+                    content_item.content_html = editor.render(new_value)
+                content_item.updated = now
+                changed_content_items.append(content_item)
+
+        if changed_content_items:
+            self.bulk_update(
+                changed_content_items, ['content_html', 'content_markup', 'updated'], batch_size=1000)
+            self.update_links(changed_content_items)
+            changed_ids = [content_item.pk for content_item in changed_content_items]
+            bump_content_version(content_item_ids=changed_ids)
+            purge.add_urls(lambda: self.get_page_urls(changed_ids))
 
 
 class PageManager(TreeManager):
+    # Urls that didn't match a page, keyed by (page tree version, url). Shared by all instances.
+    missing_urls = LRUCache(MISSING_URL_CACHE_SIZE)
 
     def link_parent_objects(self, pages):
         """
@@ -140,53 +331,323 @@ class PageManager(TreeManager):
             p._ancestors_retrieved = True
         return pages
 
+    def update_absolute_urls(self, commit=True):
+        """
+        Recompute the stored absolute urls of all pages, and return the pages whose stored url was out of date. Pages
+        with a named url (see `has_named_page_url`) don't store their url.
+
+        If `commit` is False the changed pages are not saved.
+        """
+        absolute_urls = {}
+        named_ids = set()
+        changed_pages = []
+        old_urls = []
+        # The queryset contains all pages in tree order, so parents come before their children
+        for page in self.model.tree.get_queryset():
+            if has_named_page_url(page.url, page.parent_id in named_ids):
+                # Named urls aren't stored
+                named_ids.add(page.id)
+                absolute_url = ''
+            else:
+                absolute_url = get_absolute_page_url(page.url, absolute_urls.get(page.parent_id)) or ''
+            absolute_urls[page.id] = absolute_url
+            if absolute_url != page.absolute_url:
+                old_urls.append(page.absolute_url)
+                page.absolute_url = absolute_url
+                changed_pages.append(page)
+
+        if commit and changed_pages:
+            self.bulk_update(changed_pages, ['absolute_url'], batch_size=1000)
+            bump_page_tree_version()
+            changed_ids = [page.id for page in changed_pages]
+            purge.add_urls(old_urls)
+            purge.add_urls(lambda: self.get_affected_urls(changed_ids, menus_changed=True))
+        return changed_pages
+
+    def get_urls(self, page_ids):
+        """
+        Return the absolute urls of the given pages.
+        """
+        return set(self.model.tree.filter(id__in=list(page_ids)).values_list('absolute_url', flat=True))
+
+    def changes_menus(self, page):
+        """
+        Return whether saving `page` changes how it is shown in menus, i.e. whether one of `MENU_FIELDS` changed.
+        """
+        if not page.pk:
+            return True
+        old_values = self.model.tree.filter(pk=page.pk).values(*MENU_FIELDS).first()
+        return old_values is None or any(getattr(page, field) != value for field, value in old_values.items())
+
+    def get_affected_urls(self, page_ids, menus_changed=False):
+        """
+        Return the absolute urls of the pages that show the given pages: the pages themselves, their descendants,
+        whose urls derive from theirs, and the pages whose menus include them.
+
+        Menus are global: pages at level 1 are shown in menus on every page, so for them, or if `menus_changed`, the
+        urls of all pages are returned. Otherwise the menus that include a page are those of the subtree of its
+        parent. Takes at most two queries.
+        """
+        page_ids = list(page_ids)
+        if not page_ids:
+            return set()
+        pages = self.model.tree.get_queryset().exclude(absolute_url='')
+        if not menus_changed:
+            positions = list(self.model.tree.filter(id__in=page_ids).values_list(
+                'level', 'parent__tree_id', 'parent__lft', 'parent__rght', 'tree_id', 'lft', 'rght'))
+            if not positions:
+                return set()
+            if all(level != 1 for level, *position in positions):
+                subtrees = {
+                    (tree_id, lft, rght) if parent_tree_id is None else (parent_tree_id, parent_lft, parent_rght)
+                    for level, parent_tree_id, parent_lft, parent_rght, tree_id, lft, rght in positions
+                }
+                pages = pages.filter(reduce(operator.or_, (
+                    models.Q(tree_id=tree_id, lft__gte=lft, rght__lte=rght) for tree_id, lft, rght in subtrees)))
+        return set(pages.values_list('absolute_url', flat=True))
+
+    def get_with_ancestors(self, page_id, tree_id, lft, rght):
+        """
+        Retrieve a page and its ancestors in one query, with the 'parent' objects linked. Returns None when the
+        page isn't found at the given position in the tree.
+        """
+        # get_absolute_url() and the menus access .parent recursively, so retrieving the ancestors at the same
+        # time is more efficient.
+        route_pages = list(self.get_queryset().filter(tree_id=tree_id, lft__lte=lft, rght__gte=rght))
+        if route_pages and route_pages[-1].id == page_id:
+            return self.link_parent_objects(route_pages)[-1]
+
+    def get_tree_snapshot(self):
+        """
+        Return a PageTreeSnapshot of all pages.
+
+        The snapshot is built once per process and rebuilt when the page tree version changes.
+        """
+        return get_local('tree_snapshot', lambda: PageTreeSnapshot(self.model.tree.get_queryset()))
+
+    def get_url_index(self):
+        """
+        Return a dict that maps urls to the (id, tree_id, lft, rght) of the page that lives there.
+
+        The index is built once per process and rebuilt when the page tree version changes.
+        """
+        return get_local('url_index', self.build_url_index)
+
+    def get_named_url_index(self):
+        """
+        Return a dict that maps the urls of pages with a named url (see `has_named_page_url`), reversed in the active
+        language, to the (id, tree_id, lft, rght) of the page.
+
+        The index is built once per process and language, and rebuilt when the page tree version changes.
+        """
+        return get_local('named_url_index:%s' % get_language(), self.build_named_url_index)
+
+    def get_redirect_map(self):
+        """
+        Return a dict that maps urls to the absolute urls that the public pages living there redirect to.
+
+        The map is built once per process and language from the url indexes and one query, and rebuilt when the page
+        tree version changes.
+        """
+        return get_local('redirect_map:%s' % get_language(), self.build_redirect_map)
+
+    def build_redirect_map(self):
+        pages = self.model.tree.filter(is_public=True, redirect_page__isnull=False).exclude(
+            redirect_page=models.F('id'))
+        named_url_index = self.get_named_url_index()
+
+        # Redirects to pages with a named url go to the url in the active language
+        named_urls = {page_id: url for url, (page_id, tree_id, lft, rght) in named_url_index.items()}
+        redirect_urls = {
+            page_id: redirect_url or named_urls.get(redirect_page_id)
+            for page_id, redirect_page_id, redirect_url in pages.values_list(
+                'id', 'redirect_page', 'redirect_page__absolute_url')
+        }
+        url_index = {**named_url_index, **self.get_url_index()}
+        return {
+            url: redirect_urls[page_id]
+            for url, (page_id, tree_id, lft, rght) in url_index.items()
+            if redirect_urls.get(page_id)
+        }
+
+    def get_redirect_url(self, url):
+        """
+        Return the absolute url that the page at `url` redirects to, without queries. Only known with
+        `FIBER_LOCAL_CACHE`; otherwise None is returned and the redirect is left to the view.
+        """
+        if not LOCAL_CACHE:
+            return None
+        return self.get_redirect_map().get(url)
+
+    def flatten_redirects(self, commit=True):
+        """
+        Let pages that redirect to a page that redirects as well redirect to the last page of the chain. Return the
+        pages whose redirect page changed, and the sets of ids of pages that redirect in a loop, which are left alone.
+
+        If `commit` is False the changed pages are not saved.
+        """
+        pages = {page.id: page for page in self.model.tree.filter(redirect_page__isnull=False).exclude(
+            redirect_page=models.F('id'))}
+        changed_pages = []
+        loops = set()
+        for page in pages.values():
+            target_id = page.redirect_page_id
+            chain = [page.id]
+            while target_id in pages and target_id not in chain:
+                chain.append(target_id)
+                target_id = pages[target_id].redirect_page_id
+            if target_id in chain:
+                loops.add(frozenset(chain[chain.index(target_id):]))
+            elif target_id != page.redirect_page_id:
+                page.redirect_page_id = target_id
+                changed_pages.append(page)
+
+        if commit and changed_pages:
+            self.bulk_update(changed_pages, ['redirect_page'], batch_size=1000)
+            bump_page_tree_version()
+            purge.add_urls([page.absolute_url for page in changed_pages])
+        return changed_pages, loops
+
+    def build_url_index(self):
+        pages = list(self.model.tree.get_queryset().values_list('id', 'tree_id', 'lft', 'rght', 'url', 'absolute_url'))
+        url_index = {}
+
+        # Pages whose `url` matches exactly take precedence over absolute urls, like in get_by_url.
+        for page_id, tree_id, lft, rght, url, absolute_url in pages:
+            if url:
+                url_index.setdefault(url, (page_id, tree_id, lft, rght))
+        for page_id, tree_id, lft, rght, url, absolute_url in pages:
+            if absolute_url:
+                url_index.setdefault(absolute_url, (page_id, tree_id, lft, rght))
+        return url_index
+
+    def build_named_url_index(self, pages=None):
+        # `pages` are (id, tree_id, lft, rght, parent_id, url) tuples in tree order. Only pages without a stored
+        # absolute url can have a named url.
+        if pages is None:
+            pages = self.model.tree.filter(absolute_url='').exclude(url='').values_list(
+                'id', 'tree_id', 'lft', 'rght', 'parent_id', 'url')
+        named_urls = {}
+        url_index = {}
+        for page_id, tree_id, lft, rght, parent_id, url in pages:
+            if has_named_page_url(url, parent_id in named_urls):
+                named_urls[page_id] = get_absolute_page_url(url, named_urls.get(parent_id) or None)
+                if named_urls[page_id]:
+                    url_index.setdefault(named_urls[page_id], (page_id, tree_id, lft, rght))
+        return url_index
+
+    def get_by_url_from_index(self, url):
+        """
+        Retrieve a page that matches the given URL using the url indexes. The page is returned with its ancestors
+        attached, which takes a single query.
+        """
+        try:
+            page_id, tree_id, lft, rght = self.get_url_index()[url]
+        except KeyError:
+            try:
+                page_id, tree_id, lft, rght = self.get_named_url_index()[url]
+            except KeyError:
+                return None
+
+        # Fall back to the database if the index is out of date
+        return self.get_with_ancestors(page_id, tree_id, lft, rght) or self.get_by_url_from_database(url)
+
     def get_by_url(self, url):
         """
         Retrieve a page that matches the given URL.
         """
-        # We need to check against get_absolute_url(). Typically this will
-        # recursively access .parent, so we retrieve the ancestors at the same time
-        # for efficiency.
-
+        if LOCAL_CACHE:
+            return self.get_by_url_from_index(url)
+        if not self.missing_urls.size:
+            return self.get_by_url_from_database(url)
+
+        # Entries are stamped with the page tree version, so they are no longer used once a page is changed. Named
+        # urls depend on the active language.
+        key = (get_page_tree_version(), get_language(), url)
+        if self.missing_urls.get(key):
+            return None
+        page = self.get_by_url_from_database(url)
+        if page is None:
+            self.missing_urls.set(key, True)
+        return page
+
+    def get_for_request(self, request, url=None):
+        """
+        Retrieve the page that matches the url of the request, or `url`. The page, or the absence of one, is
+        remembered on the request, so views, middleware and template tags share a single lookup per url.
+        """
+        if url is None:
+            url = request.path_info
+        pages = getattr(request, '_fiber_pages', None)
+        if pages is None:
+            pages = request._fiber_pages = {}
+        if url not in pages:
+            pages[url] = self.get_by_url(url)
+        return pages[url]
+
+    def get_by_url_from_database(self, url):
+        """
+        Retrieve a page that matches the given URL by querying the database.
+        """
         queryset = self.get_queryset()
 
-        # First check if there is a Page whose `url` matches the requested URL.
-        try:
-            return queryset.get(url__exact=url)
-        except self.model.DoesNotExist:
-            pass
-
-        # If no Page has been found, check a subset of Pages (whose `url` or
-        # `relative_url` contain the rightmost part of the requested URL), to see
-        # if their `get_absolute_url()` matches the requested URL entirely.
-
-        # Since get_absolute_url() accesses .parent recursively, we
-        # load the ancestors efficiently in one query first
-
-        last_url_part = url.rstrip('/').rsplit('/', 1)[-1]
-        if last_url_part:
-            page_candidates = queryset.exclude(url__exact='', ).filter(url__icontains=last_url_part)
-
-            # We need all the ancestors of all the candidates. We can do this in
-            # two queries - one for candidates, one for ancestors:
-            route_pages = self.model.objects.none()
-            for p in page_candidates:
-                route_pages = route_pages | queryset.filter(lft__lte=p.lft,
-                                                      rght__gte=p.rght)
-            route_pages = self.link_parent_objects(route_pages)
-            # Use page_candidates that have parent objects attached
-            page_candidates = [p for p in route_pages if last_url_part in p.url]
-
-            for page in page_candidates:
-                if page.get_absolute_url() == url:
-                    return page
-
-        # If no Page has been found, try to find a Page by matching the
-        # requested URL with reversed `named_url`s.
-        page_candidates = queryset.filter(url__startswith='"', url__endswith='"')
-        for page in page_candidates:
-            if get_named_url_from_quoted_url(page.url) == url:
-                return page
+        # A Page whose `url` matches the requested URL takes precedence over a Page whose (stored) absolute url
+        # matches the requested URL. Named urls aren't stored, so the pages that can have one are retrieved in the
+        # same query, and their urls are reversed in the active language.
+        pages = list(queryset.filter(
+            models.Q(url__exact=url) | models.Q(absolute_url__exact=url) | (
+                models.Q(absolute_url='') & ~models.Q(url=''))))
+        matches = [p for p in pages if url in (p.url, p.absolute_url)]
+        if matches:
+            page = next((p for p in matches if p.url == url), matches[0])
+            return self.get_with_ancestors(page.id, page.tree_id, page.lft, page.rght)
+
+        position = self.build_named_url_index(
+            [(p.id, p.tree_id, p.lft, p.rght, p.parent_id, p.url) for p in pages]).get(url)
+        if position:
+            return self.get_with_ancestors(*position)
+
+    def get_jqtree_urls(self):
+        """
+        Return the admin urls used in jqtree data: the add url, and the parts of the change urls before and after
+        the page id. The urls are reversed once, instead of for every page.
+        """
+        return {
+            'add_url': self.model.get_add_url(),
+            'change_url': get_change_url_parts(self.model),
+        }
+
+    def get_jqtree_page_info(self, page, editable, urls):
+        """
+        Return the jqTree node data of `page`, without its children. `urls` are the urls from `get_jqtree_urls`.
+        """
+        page_info = dict(
+            label=page.title,
+            id=page.id,
+            editable=editable
+        )
+
+        url = page.absolute_url or page.get_absolute_url()
+        if url:
+            # normal pages
+            page_info['url'] = url
+            page_info['change_url'] = '%s%s%s' % (urls['change_url'][0], page.id, urls['change_url'][1])
+            page_info['add_url'] = urls['add_url']
+
+            page_info['show_in_menu'] = page.show_in_menu
+            page_info['is_public'] = page.is_public
+            page_info['is_redirect'] = bool(page.redirect_page_id)
+        else:
+            # root nodes / menu 'pages'
+            page_info['add_url'] = urls['add_url']
+        return page_info
+
+    def get_editable_ids(self, user, queryset):
+        """
+        Return the set of ids of the pages in `queryset` that `user` is allowed to edit. The permission class
+        filters the pages once, instead of testing each page.
+        """
+        return {page.id for page in load_class(PERMISSION_CLASS).filter_objects(user, queryset)}
 
     def create_jqtree_data(self, user):
         """
@@ -210,34 +671,15 @@ class PageManager(TreeManager):
         data = []
         page_dict = dict()  # maps page id to page info
 
-        # The queryset contains all pages in correct order
+        # The queryset contains all pages in correct order, so parents come before their children
         queryset = self.model.tree.get_queryset()
-
-        # Filter queryset using the permissions class
-        editables_queryset = load_class(PERMISSION_CLASS).filter_objects(user, queryset)
+        editable_ids = self.get_editable_ids(user, queryset)
+        urls = self.get_jqtree_urls()
 
         for page in queryset:
-            page_info = dict(
-                label=page.title,
-                id=page.id,
-                editable=page in editables_queryset
-            )
+            page_info = self.get_jqtree_page_info(page, page.id in editable_ids, urls)
 
-            url = page.get_absolute_url()
-            if url:
-                # normal pages
-                page_info['url'] = url
-                page_info['change_url'] = page.get_change_url()
-                page_info['add_url'] = page.get_add_url()
-
-                page_info['show_in_menu'] = page.show_in_menu
-                page_info['is_public'] = page.is_public
-                page_info['is_redirect'] = bool(page.redirect_page)
-            else:
-                # root nodes / menu 'pages'
-                page_info['add_url'] = page.get_add_url()
-
-            if not page.parent:
+            if page.parent_id is None:
                 # root node
                 data.append(page_info)
             else:
@@ -249,3 +691,58 @@ class PageManager(TreeManager):
 
             page_dict[page.id] = page_info
         return data
+
+    def create_jqtree_level_data(self, user, parent_id=None):
+        """
+        Create jqtree data for one level of the page tree: the children of the page with id `parent_id`, or the root
+        nodes if `parent_id` is None.
+
+        Pages that have children are marked with `load_on_demand`, so jqtree retrieves their children when they
+        are opened.
+        """
+        queryset = self.model.tree.get_queryset().filter(parent_id=parent_id)
+        editable_ids = self.get_editable_ids(user, queryset)
+        urls = self.get_jqtree_urls()
+
+        data = []
+        for page in queryset:
+            page_info = self.get_jqtree_page_info(page, page.id in editable_ids, urls)
+            if page.rght - page.lft > 1:
+                page_info['load_on_demand'] = True
+            data.append(page_info)
+        return data
+
+    def search(self, query):
+        """
+        Return the pages whose title or url contains `query`, in tree order.
+        """
+        if not query:
+            return self.none()
+        return self.model.tree.get_queryset().filter(
+            models.Q(title__icontains=query) | models.Q(absolute_url__icontains=query))
+
+    def create_jqtree_search_data(self, user, pages):
+        """
+        Create a flat list of jqtree nodes for `pages`, e.g. search results. Each node includes the ids of the
+        ancestors of the page, so the page can be opened in a tree that is loaded on demand.
+        """
+        pages = list(pages)
+        if not pages:
+            return []
+
+        # Retrieve the ancestors of all pages in one query
+        ancestors = list(self.model.tree.get_queryset().filter(reduce(operator.or_, (
+            models.Q(tree_id=page.tree_id, lft__lt=page.lft, rght__gt=page.rght) for page in pages
+        ))).values_list('id', 'tree_id', 'lft', 'rght'))
+        editable_ids = self.get_editable_ids(user, self.filter(id__in=[page.id for page in pages]))
+        urls = self.get_jqtree_urls()
+
+        data = []
+        for page in pages:
+            page_info = self.get_jqtree_page_info(page, page.id in editable_ids, urls)
+            page_info['ancestor_ids'] = [
+                ancestor_id for ancestor_id, tree_id, lft, rght in ancestors
+                if tree_id == page.tree_id and lft < page.lft and rght > page.rght
+            ]
+            data.append(page_info)
+        return data
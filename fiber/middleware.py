@@ -1,3 +1,4 @@
+import codecs
 import json
 import random
 import re
@@ -5,16 +6,28 @@ from django.http import HttpResponseRedirect
 from django.template import loader
 from django.urls import reverse
 from django.utils.deprecation import MiddlewareMixin
-from django.utils.encoding import force_str
+from django.utils.functional import SimpleLazyObject
 from django.utils.html import escape
 from urllib.parse import unquote
 
-from .app_settings import LOGIN_STRING, EXCLUDE_URLS, EDITOR, PERMISSION_CLASS
+from .app_settings import LOGIN_STRING, EXCLUDE_URLS, EDITOR, OBFUSCATED_EMAIL_CACHE_SIZE, PERMISSION_CLASS
+from .cache import LRUCache
 from .models import Page
+from .utils.html import HtmlInjector
 from .utils.import_util import import_element, load_class
 
 perms = load_class(PERMISSION_CLASS)
 
+# http://www.lampdocs.com/blog/2008/10/regular-expression-to-extract-all-e-mail-addresses-from-a-file-with-php/
+EMAIL_RE = re.compile(
+    r'\b(?P<email>(mailto:)?[\w-]+(\.[\w-]+)*(\+[\w-]+)?@[a-zA-Z0-9-]+(\.[a-zA-Z0-9-]+)*\.(([0-9]{1,3})|([a-zA-Z]+)))\b')
+# The characters besides letters and digits that can be part of a match of EMAIL_RE
+EMAIL_PUNCTUATION = '_-.+@:'
+# At most this many characters are carried over between the chunks of a streaming response
+MAX_EMAIL_LENGTH = 320
+
+encoded_emails = LRUCache(OBFUSCATED_EMAIL_CACHE_SIZE)
+
 
 def is_html(response):
     """
@@ -26,17 +39,14 @@ def is_html(response):
 
 class AdminPageMiddleware(MiddlewareMixin):
     LOGIN_SESSION_KEY = 'show_fiber_login'
-    body_re = re.compile(
-        r'<head>(?P<HEAD>.*)</head>(?P<AFTER_HEAD>.*)<body(?P<BODY_ATTRS>.*?)>(?P<BODY>.*)</body>',
-        re.DOTALL)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.editor_settings = import_element(EDITOR)
 
     def process_response(self, request, response):
-        # only process non-streaming html and xhtml responses
-        if is_html(response) and hasattr(response, 'content'):
+        # only process html and xhtml responses
+        if is_html(response):
             if self.should_setup_login_session(request):
                 return self.setup_login_session(request)
             if self.show_login(request) or self.show_admin(request, response):
@@ -94,10 +104,11 @@ class AdminPageMiddleware(MiddlewareMixin):
     def modify_response(self, request, response):
         """
         Modify the response to include Fiber assets and data.
+
+        The html is injected in a single pass over the encoded content; streaming responses are modified on the fly.
         """
         fiber_data = {}
-        replacement = r'<head>\g<HEAD>%(header_html)s</head>\g<AFTER_HEAD><body data-fiber-data="%(fiber_data)s"\g<BODY_ATTRS>>\g<BODY></body>'
-        content = force_str(response.content)
+        body_start_html = body_end_html = ''
         if self.show_login(request):
             # Only show the login window once
             request.session[self.LOGIN_SESSION_KEY] = False
@@ -107,25 +118,33 @@ class AdminPageMiddleware(MiddlewareMixin):
                 fiber_data['backend'] = True
             else:
                 fiber_data['frontend'] = True
-                page = Page.objects.get_by_url(request.path_info)
+                page = Page.objects.get_for_request(request)
                 if page:
                     fiber_data['page_id'] = page.pk
 
                 # Inject admin html in body, wrap the original body content in a div.
-                replacement = r'<head>\g<HEAD>%(header_html)s</head>\g<AFTER_HEAD><body data-fiber-data="%(fiber_data)s"\g<BODY_ATTRS>><div id="wpr-body">\g<BODY></body>'
-                content = content.replace('</body>', '</div>%s</body>' % self.get_body_html(request))
+                body_start_html = '<div id="wpr-body">'
+                body_end_html = '</div>%s' % self.get_body_html(request)
 
         # Inject header html in head.
         # Add fiber-data attribute to body tag.
-        replacement = replacement % {
-            'header_html': self.get_header_html(request),
-            'fiber_data': escape(json.dumps(fiber_data, sort_keys=True))
-        }
-        response.content = self.body_re.sub(replacement, content)
-        if response.has_header('Content-Length'):
-            # Reset 'Content-Length' header (usually set by CommonMiddleware)
-            # to make sure clients read the full response body
-            response['Content-Length'] = str(len(response.content))
+        body_attrs = ' data-fiber-data="%s"' % escape(json.dumps(fiber_data, sort_keys=True))
+        injector = HtmlInjector(
+            head_html=self.get_header_html(request).encode(response.charset),
+            body_attrs=body_attrs.encode(response.charset),
+            body_start_html=body_start_html.encode(response.charset),
+            body_end_html=body_end_html.encode(response.charset),
+        )
+        if response.streaming:
+            response.streaming_content = injector.stream(response.streaming_content)
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        else:
+            response.content = injector.inject(response.content)
+            if response.has_header('Content-Length'):
+                # Reset 'Content-Length' header (usually set by CommonMiddleware)
+                # to make sure clients read the full response body
+                response['Content-Length'] = str(len(response.content))
         # In Django 3.0 the X-Frame-Options HTTP header default value was set to 'deny'. This meant
         # that the Fiber admin views - that load part of the admin in a frame - no longer worked.
         # Rather than forcing the entire website to use the X_FRAME_OPTIONS setting to change the
@@ -158,27 +177,88 @@ class AdminPageMiddleware(MiddlewareMixin):
             return '{}?next={}'.format(reverse('admin:logout'), request.path_info)
 
 
+class FiberPageMiddleware(MiddlewareMixin):
+    """
+    Adds `request.fiber_page`, the page that matches the url of the request. It is looked up when it's first used,
+    and evaluates as false when there's no such page. Template tags use it when there's no fiber_page in the context.
+    """
+
+    def process_request(self, request):
+        request.fiber_page = SimpleLazyObject(lambda: Page.objects.get_for_request(request))
+
+
 class ObfuscateEmailAddressMiddleware(MiddlewareMixin):
     """
-    Replaces plain email addresses with escaped addresses in (non streaming) HTML responses
+    Replaces plain email addresses with escaped addresses in HTML responses
     """
 
     def process_response(self, request, response):
-        if is_html(response) and hasattr(response, 'content'):  # Do not obfuscate non-html and streaming responses.
-            # http://www.lampdocs.com/blog/2008/10/regular-expression-to-extract-all-e-mail-addresses-from-a-file-with-php/
-            email_pattern = re.compile(
-                r'\b(?P<email>(mailto:)?[\w-]+(\.[\w-]+)*(\+[\w-]+)?@[a-zA-Z0-9-]+(\.[a-zA-Z0-9-]+)*\.(([0-9]{1,3})|([a-zA-Z]+)))\b')
-            response.content = email_pattern.sub(self.replace_email, force_str(response.content))
-            if response.has_header('Content-Length'):
-                # Reset 'Content-Length' header (usually set by CommonMiddleware)
-                # to make sure clients read the full response body
-                response['Content-Length'] = str(len(response.content))
+        if is_html(response):  # Do not obfuscate non-html responses.
+            if response.streaming:
+                response.streaming_content = self.obfuscate_chunks(response.streaming_content, response.charset)
+                if response.has_header('Content-Length'):
+                    del response['Content-Length']
+            elif b'@' in response.content:
+                response.content = self.obfuscate(response.content.decode(response.charset))
+                if response.has_header('Content-Length'):
+                    # Reset 'Content-Length' header (usually set by CommonMiddleware)
+                    # to make sure clients read the full response body
+                    response['Content-Length'] = str(len(response.content))
         return response
 
+    def obfuscate(self, text):
+        if '@' not in text:
+            return text
+        return EMAIL_RE.sub(self.replace_email, text)
+
+    def obfuscate_chunks(self, chunks, charset):
+        """
+        Obfuscate the email addresses in an encoded stream of chunks.
+
+        The characters at the end of a chunk that may be part of an email address are carried over to the next chunk.
+        """
+        decoder = codecs.getincrementaldecoder(charset)()
+        carry = ''
+        for chunk in chunks:
+            text = carry + decoder.decode(chunk)
+            end = get_email_tail_start(text)
+            carry = text[end:]
+            if end:
+                yield self.obfuscate(text[:end]).encode(charset)
+        text = carry + decoder.decode(b'', final=True)
+        if text:
+            yield self.obfuscate(text).encode(charset)
+
     def replace_email(self, matches):
         email = matches.group('email')
         return matches.group().replace(email, self.encode_email(email))
 
     def encode_email(self, email):
-        formats = '&#{:d};', '&#x{:x};'
-        return ''.join(random.choice(formats).format(ord(c)) for c in email)
+        if not encoded_emails.size:
+            return encode_email(email, random)
+        encoded = encoded_emails.get(email)
+        if encoded is None:
+            # Seed with the address, so it's encoded the same way by every process
+            encoded = encode_email(email, random.Random(email))
+            encoded_emails.set(email, encoded)
+        return encoded
+
+
+def encode_email(email, rng):
+    """
+    Return `email` with each character randomly encoded as a decimal or hexadecimal character reference.
+    """
+    formats = '&#{:d};', '&#x{:x};'
+    bits = rng.getrandbits(len(email))
+    return ''.join(formats[bits >> i & 1].format(ord(c)) for i, c in enumerate(email))
+
+
+def get_email_tail_start(text):
+    """
+    Return the start of the characters at the end of `text` that may be (the start of) an email address.
+    """
+    start = len(text)
+    limit = max(0, start - MAX_EMAIL_LENGTH)
+    while start > limit and (text[start - 1].isalnum() or text[start - 1] in EMAIL_PUNCTUATION):
+        start -= 1
+    return start
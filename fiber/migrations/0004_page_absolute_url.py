@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+from fiber.utils.urls import get_absolute_page_url, has_named_page_url
+
+
+def backfill_absolute_urls(apps, schema_editor):
+    Page = apps.get_model('fiber', 'Page')
+    absolute_urls = {}
+    named_ids = set()
+    pages = []
+    for page in Page.objects.order_by('tree_id', 'lft'):
+        if has_named_page_url(page.url, page.parent_id in named_ids):
+            named_ids.add(page.id)
+            page.absolute_url = ''
+        else:
+            page.absolute_url = get_absolute_page_url(page.url, absolute_urls.get(page.parent_id)) or ''
+        absolute_urls[page.id] = page.absolute_url
+        pages.append(page)
+    Page.objects.bulk_update(pages, ['absolute_url'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('fiber', '0003_update_mptt_fields'),
+    ]
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='absolute_url',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=1000, verbose_name='absolute url'),
+        ),
+        migrations.RunPython(backfill_absolute_urls, migrations.RunPython.noop),
+    ]
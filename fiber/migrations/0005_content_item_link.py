@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from fiber.utils.html import get_hrefs
+
+
+def backfill_content_item_links(apps, schema_editor):
+    ContentItem = apps.get_model('fiber', 'ContentItem')
+    ContentItemLink = apps.get_model('fiber', 'ContentItemLink')
+    links = []
+    for content_item_id, content_html in ContentItem.objects.values_list('id', 'content_html').iterator():
+        for url in sorted(get_hrefs(content_html)):
+            links.append(ContentItemLink(content_item_id=content_item_id, url=url[:1000]))
+    ContentItemLink.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('fiber', '0004_page_absolute_url'),
+    ]
+    operations = [
+        migrations.CreateModel(
+            name='ContentItemLink',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(db_index=True, max_length=1000, verbose_name='url')),
+                ('content_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='links', to='fiber.contentitem', verbose_name='content item')),
+            ],
+            options={
+                'verbose_name': 'content item link',
+                'verbose_name_plural': 'content item links',
+            },
+        ),
+        migrations.RunPython(backfill_content_item_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+from fiber.utils.html import get_summary
+
+
+def backfill_summaries(apps, schema_editor):
+    ContentItem = apps.get_model('fiber', 'ContentItem')
+    content_items = []
+    for content_item in ContentItem.objects.only('id', 'content_html').iterator():
+        content_item.summary = get_summary(content_item.content_html)
+        content_items.append(content_item)
+    ContentItem.objects.bulk_update(content_items, ['summary'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('fiber', '0005_content_item_link'),
+    ]
+    operations = [
+        migrations.AddField(
+            model_name='contentitem',
+            name='summary',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='summary'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,7 @@ from operator import attrgetter
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.encoding import force_str
 
+from .app_settings import LOCAL_CACHE
 from .models import Page
 
 
@@ -41,13 +42,22 @@ class FiberPageMixin:
 
     def get_fiber_page(self):
         if self.fiber_page is None:
-            self.fiber_page = Page.objects.get_by_url(self.get_fiber_page_url())
+            request = getattr(self, 'request', None)
+            if request is not None:
+                # Shares the lookup with AdminPageMiddleware and `request.fiber_page`
+                self.fiber_page = Page.objects.get_for_request(request, self.get_fiber_page_url())
+            else:
+                self.fiber_page = Page.objects.get_by_url(self.get_fiber_page_url())
         return self.fiber_page
 
     def get_fiber_current_pages(self):
         """
         Find pages that should be marked as current in menus.
         """
+        if not self.fiber_current_pages and LOCAL_CACHE:
+            self.fiber_current_pages = self.get_fiber_current_pages_from_snapshot()
+            return self.fiber_current_pages
+
         if not self.fiber_current_pages:  # None or empty list
             current_pages = set()
             current_page = self.get_fiber_page()
@@ -71,3 +81,28 @@ class FiberPageMixin:
             self.fiber_current_pages = sorted(current_pages, key=attrgetter('lft'))[1:]
 
         return self.fiber_current_pages
+
+    def get_fiber_current_pages_from_snapshot(self):
+        """
+        Find pages that should be marked as current in menus, using the in-memory page tree snapshot.
+        """
+        snapshot = Page.objects.get_tree_snapshot()
+        current_pages = []
+
+        def add_with_ancestors(page):
+            current_pages.append(page)
+            current_pages.extend(snapshot.get_ancestors(page))
+
+        current_page = self.get_fiber_page()
+        if current_page:
+            if snapshot.get(current_page.pk):
+                add_with_ancestors(snapshot.get(current_page.pk))
+            else:
+                current_pages.extend([current_page] + list(current_page.get_ancestors()))
+
+        for page in snapshot.get_mark_current_pages(force_str(self.get_fiber_page_url())):
+            add_with_ancestors(page)
+
+        # Order current_pages for use with tree_info template tag, remove the root page in the process.
+        current_pages = dict((page.pk, page) for page in current_pages).values()
+        return snapshot.copy_pages(sorted(current_pages, key=attrgetter('lft'))[1:])
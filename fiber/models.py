@@ -5,7 +5,6 @@ import warnings
 from django.core.files.images import get_image_dimensions
 from django.db import models
 from django.urls import reverse
-from django.utils.html import strip_tags
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext
 from django.utils.translation import gettext_lazy as _
@@ -13,16 +12,18 @@ from django.utils.translation import gettext_lazy as _
 from mptt.managers import TreeManager
 from mptt.models import MPTTModel
 
+from . import editor, purge
+from .cache import bump_content_version, bump_page_tree_version
 from .app_settings import (
     IMAGES_DIR, FILES_DIR, METADATA_PAGE_SCHEMA, METADATA_CONTENT_SCHEMA,
     PAGE_MANAGER, CONTENT_ITEM_MANAGER, LIST_THUMBNAIL_OPTIONS
 )
-from .utils.html import htmlentitydecode
+from .utils.html import get_summary
 from .utils.import_util import load_class
 from .utils.fields import FiberURLField, FiberMarkupField, FiberHTMLField
 from .utils.images import get_thumbnail, get_thumbnail_url, ThumbnailException
 from .utils.json import JSONField
-from .utils.urls import get_named_url_from_quoted_url, is_quoted_url
+from .utils.urls import get_absolute_page_url, has_named_page_url, is_quoted_url, is_relative_url
 
 
 class ContentItem(models.Model):
@@ -35,6 +36,7 @@ class ContentItem(models.Model):
     metadata = JSONField(_('metadata'), blank=True, null=True, schema=METADATA_CONTENT_SCHEMA, prefill_from='fiber.models.ContentItem')
     template_name = models.CharField(_('template name'), blank=True, max_length=70)
     used_on_pages_data = JSONField(_('used on pages'), blank=True, null=True)
+    summary = models.CharField(_('summary'), max_length=255, blank=True, editable=False)
 
     objects = load_class(CONTENT_ITEM_MANAGER)
 
@@ -46,10 +48,9 @@ class ContentItem(models.Model):
         if self.name:
             return self.name
         else:
-            contents = ' '.join(htmlentitydecode(strip_tags(self.content_html)).strip().split())
-            if len(contents) > 50:
-                contents = contents[:50] + '...'
-            return contents or gettext('[ EMPTY ]')  # TODO: find out why gettext_lazy doesn't work here
+            # The summary is stored when the content item is saved
+            summary = self.summary if self.pk else get_summary(self.content_html)
+            return summary or gettext('[ EMPTY ]')  # TODO: find out why gettext_lazy doesn't work here
 
     @classmethod
     def get_add_url(cls):
@@ -60,15 +61,22 @@ class ContentItem(models.Model):
         named_url = f'fiber_admin:{self._meta.app_label}_{self._meta.object_name.lower()}_change'
         return reverse(named_url, args=(self.id, ))
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        content_changed = update_fields is None or {'content_html', 'content_markup'}.intersection(update_fields)
+        if content_changed:
+            # With a markup editor the html is rendered when saving; the rendered html is remembered, so rendering it
+            # here too is cheap.
+            self.summary = get_summary(editor.render(self.content_markup) if editor.renderer else self.content_html)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'summary'}
+
+        super().save(*args, **kwargs)
+        if content_changed:
+            ContentItem.objects.update_links([self])
+
     def set_used_on_pages_json(self):
-        json_pages = []
-        for page_content_item in self.page_content_items.all():
-            json_pages.append({
-                'title': page_content_item.page.title,
-                'url': page_content_item.page.get_absolute_url(),
-            })
-        self.used_on_pages_data = json_pages
-        self.save()
+        ContentItem.objects.update_used_on_pages([self])
 
     def get_used_on_pages_json(self):
         if self.used_on_pages_data is None:
@@ -86,6 +94,7 @@ class Page(MPTTModel):
     title = models.CharField(_('title'), max_length=255)
     doc_title = models.CharField(_('document title'), max_length=255, blank=True)
     url = FiberURLField(blank=True)
+    absolute_url = models.CharField(_('absolute url'), max_length=1000, blank=True, db_index=True, editable=False)
     redirect_page = models.ForeignKey('self', null=True, blank=True, related_name='redirected_pages', verbose_name=_('redirect page'), on_delete=models.SET_NULL)
     mark_current_regexes = models.TextField(_('mark current regexes'), blank=True)
     # TODO: add `alias_page` field
@@ -109,34 +118,66 @@ class Page(MPTTModel):
 
     def save(self, *args, **kwargs):
         if self.id:
-            old_url = Page.objects.get(id=self.id).get_absolute_url()
+            old_url = Page.objects.filter(id=self.id).values_list('absolute_url', flat=True).first()
         else:
-            old_url = ''
+            old_url = None
 
+        self.absolute_url = '' if self.has_named_url() else self.get_absolute_url() or ''
         super().save(*args, **kwargs)
 
-        if old_url:
-            new_url = self.get_absolute_url()
-            if old_url != new_url:
-                ContentItem.objects.rename_url(old_url, new_url)
+        if old_url is not None and old_url != self.absolute_url:
+            self.update_urls(old_url)
 
     def get_absolute_url(self):
-        if self.url == '':
-            return ''
-        if self.url.startswith('/'):
-            return self.url
-        elif self.url.startswith('http://') or self.url.startswith('https://'):
-            return self.url
-        else:
-            # check if it's a named url
-            if is_quoted_url(self.url):
-                return get_named_url_from_quoted_url(self.url)
+        parent_url = None
+        if is_relative_url(self.url) and self.parent:
+            parent_url = self.parent.get_absolute_url()
+        return get_absolute_page_url(self.url, parent_url)
+
+    def has_named_url(self):
+        """
+        Return whether the url of this page is a named url, or is relative to one; see `has_named_page_url`.
+        """
+        page = self
+        while is_relative_url(page.url) and page.parent:
+            page = page.parent
+        return is_quoted_url(page.url)
+
+    def update_urls(self, old_url):
+        """
+        Propagate a change of the absolute url of this page, which used to be `old_url`:
+
+        - store the new absolute urls of the descendants, which are retrieved in one query
+        - change the urls of this page and its descendants in all content items, in one pass
+        - update `used_on_pages_data` of the content items on this page and its descendants
+        """
+        # Links to a page that gets a named url are changed to its url in the active language
+        url_map = {old_url: self.absolute_url or self.get_absolute_url() or ''}
+        absolute_urls = {self.id: self.absolute_url}
+        named_ids = {self.id} if self.has_named_url() else set()
+        subtree = [self]
+        changed_pages = []
+        for page in self.get_descendants():
+            if has_named_page_url(page.url, page.parent_id in named_ids):
+                named_ids.add(page.id)
+                absolute_url = ''
             else:
-                # relative url
-                if self.parent:
-                    return '{}/{}/'.format(self.parent.get_absolute_url().rstrip('/'), self.url.strip('/'))
-                else:
-                    return ''  # TODO: make sure this can never happen (in model.save()?)
+                absolute_url = get_absolute_page_url(page.url, absolute_urls[page.parent_id]) or ''
+            absolute_urls[page.id] = absolute_url
+            subtree.append(page)
+            if absolute_url != page.absolute_url:
+                url_map.setdefault(page.absolute_url, absolute_url)
+                page.absolute_url = absolute_url
+                changed_pages.append(page)
+
+        if changed_pages:
+            Page.objects.bulk_update(changed_pages, ['absolute_url'], batch_size=1000)
+            bump_page_tree_version()
+
+        ContentItem.objects.rename_urls(url_map)
+        ContentItem.objects.update_used_on_pages(
+            ContentItem.objects.filter(page_content_items__page__in=subtree).distinct())
+        return changed_pages
 
     @classmethod
     def get_add_url(cls):
@@ -153,6 +194,22 @@ class Page(MPTTModel):
         """
         return self.page_content_items.filter(block_name=block_name).order_by('sort')
 
+    def get_content_blocks(self):
+        """
+        Return a dict that maps block names to the sorted content items in that block. Each content item has its
+        `page_content_item` attached.
+
+        The content items of all blocks are retrieved in one query, the first time this is called.
+        """
+        if getattr(self, '_content_blocks', None) is None:
+            content_blocks = {}
+            for page_content_item in self.page_content_items.order_by('sort').select_related('content_item'):
+                content_item = page_content_item.content_item
+                content_item.page_content_item = page_content_item
+                content_blocks.setdefault(page_content_item.block_name, []).append(content_item)
+            self._content_blocks = content_blocks
+        return self._content_blocks
+
     def is_first_child(self):
         if self.is_root_node():
             return True
@@ -190,6 +247,13 @@ class Page(MPTTModel):
 
         return  self.get_ancestors(include_self=True)
 
+    def move_to(self, target, position='first-child'):
+        if purge.is_enabled():
+            # The pages at the new location are added by the `node_moved` signal
+            purge.add_urls(Page.objects.get_affected_urls([self.id], menus_changed=True))
+        # mptt saves the page after moving it, which propagates a change of its absolute url
+        super().move_to(target, position)
+
     def move_page(self, target_id, position):
         """
         Moves the node. Parameters:
@@ -198,8 +262,9 @@ class Page(MPTTModel):
             - before: move the page before the target page
             - after: move the page after the target page
             - inside: move the page inside the target page (as the first child)
+
+        The urls of the page and its descendants are changed in the content items when the moved page is saved.
         """
-        old_url = self.get_absolute_url()
         target_page = Page.tree.get(id=target_id)
 
         if position == 'before':
@@ -211,14 +276,6 @@ class Page(MPTTModel):
         else:
             raise Exception('Unknown position')
 
-        # change url in content items
-        if old_url:
-            new_url = self.get_absolute_url()
-            if old_url != new_url:
-                ContentItem.objects.rename_url(old_url, new_url)
-                for page_content_item in self.page_content_items.all():
-                    page_content_item.content_item.set_used_on_pages_json()
-
     def is_public_for_user(self, user):
         return user.is_staff or self.is_public
 
@@ -263,9 +320,12 @@ class PageContentItem(models.Model):
         )
 
         def resort():
+            # The pages that use the content items don't change, so `used_on_pages_data` doesn't need to be updated
             for i, item in enumerate(page_content_items):
                 item.sort = i
-                item.save()
+            PageContentItem.objects.bulk_update(page_content_items, ['sort'])
+            bump_content_version(page_ids=[self.page_id])
+            purge.add_urls(lambda: Page.objects.get_urls([self.page_id]))
 
         if not next_item:
             page_content_items.append(self)
@@ -277,6 +337,21 @@ class PageContentItem(models.Model):
                 resort()
 
 
+class ContentItemLink(models.Model):
+    """
+    A url that a content item links to. Used to find the content items that link to a page whose url changes.
+    """
+    content_item = models.ForeignKey(ContentItem, related_name='links', verbose_name=_('content item'), on_delete=models.CASCADE)
+    url = models.CharField(_('url'), max_length=1000, db_index=True)
+
+    class Meta:
+        verbose_name = _('content item link')
+        verbose_name_plural = _('content item links')
+
+    def __str__(self):
+        return self.url
+
+
 def images_directory(instance, filename):
     return os.path.join(IMAGES_DIR, filename)
 
@@ -47,6 +47,15 @@ class Permissions:
         """
         pass
 
+    def get_permission_scope(self, user):
+        """
+        Should return a json serializable value that is the same for users that are allowed to edit the same
+        objects. Cached admin data, like the page tree, is shared by the users in a scope.
+
+        By default every user has a scope of their own.
+        """
+        return user.pk
+
     def is_fiber_editor(self, user):
         """
         Determines if the user is allowd to see the Fiber admin interface.
@@ -0,0 +1,84 @@
+"""
+Reports the urls of the pages that change when pages or content items are written, e.g. to purge them from a reverse
+proxy or CDN.
+
+The urls of all writes in a transaction are collected, and reported once the transaction is committed: the
+`urls_changed` signal is sent and every callable in `FIBER_PURGE_SINKS` is called with the sorted, unique urls.
+Nothing is collected if there are no receivers and no sinks.
+"""
+import json
+import threading
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .app_settings import PURGE_FILE, PURGE_SINKS
+from .utils.import_util import import_element
+
+# Sent with `urls`, the sorted list of changed urls
+urls_changed = Signal()
+
+_local = threading.local()
+
+
+def is_enabled():
+    return bool(PURGE_SINKS) or urls_changed.has_listeners()
+
+
+class UrlBatch:
+    """
+    The urls that changed in a transaction. Registered as an on-commit hook of that transaction.
+    """
+
+    def __init__(self):
+        self.urls = set()
+        self.get_urls_callables = []
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        urls = set(self.urls)
+        for get_urls in self.get_urls_callables:
+            urls.update(get_urls())
+        urls.discard('')
+        if urls:
+            send_urls(sorted(urls))
+
+
+def add_urls(urls):
+    """
+    Add urls to the batch of the current transaction. `urls` may also be a callable that returns urls; it is called
+    once the transaction is committed, to get the urls of the committed state.
+    """
+    if not is_enabled():
+        return
+    batch = getattr(_local, 'batch', None)
+    connection = transaction.get_connection()
+    # A batch is done when its hook has run, or discarded because its transaction was rolled back
+    new_batch = batch is None or batch.done or not any(hook[1] is batch for hook in connection.run_on_commit)
+    if new_batch:
+        batch = _local.batch = UrlBatch()
+    if callable(urls):
+        batch.get_urls_callables.append(urls)
+    else:
+        batch.urls.update(urls)
+    if new_batch:
+        # Outside of a transaction this calls the batch right away
+        transaction.on_commit(batch)
+
+
+def send_urls(urls):
+    urls_changed.send(sender=None, urls=urls)
+    for sink in PURGE_SINKS:
+        import_element(sink)(urls)
+
+
+def write_json_lines(urls):
+    """
+    A sink that appends a line with the urls to the file `FIBER_PURGE_FILE`, e.g. as a local stand-in for the purge
+    api of a CDN.
+    """
+    line = json.dumps({'time': timezone.now().isoformat(), 'urls': urls})
+    with open(PURGE_FILE, 'a') as f:
+        f.write(line + '\n')
@@ -10,7 +10,7 @@ POSITION_CHOICES = sorted((item, item) for item in ['before', 'after', 'inside']
 
 class PageSerializer(serializers.ModelSerializer):
     move_url = serializers.HyperlinkedIdentityField(view_name='page-move')
-    page_url = serializers.ReadOnlyField(source='get_absolute_url')
+    page_url = serializers.SerializerMethodField()
     depth = 1
 
     class Meta:
@@ -21,6 +21,9 @@ class PageSerializer(serializers.ModelSerializer):
         if model_field.name == 'url':
             return serializers.URLField()
 
+    def get_page_url(self, page):
+        return page.absolute_url or page.get_absolute_url()
+
 
 class MovePageSerializer(serializers.Serializer):
     position = serializers.ChoiceField(choices=POSITION_CHOICES)
@@ -89,3 +92,11 @@ class FiberPaginationSerializer(pagination.PageNumberPagination):
             'total_pages': self.page.paginator.num_pages,
             'rows': data
         })
+
+
+class PageTreeSearchPagination(FiberPaginationSerializer):
+    page_size = 50
+
+
+class ContentItemGroupPagination(FiberPaginationSerializer):
+    page_size = 100
@@ -9,6 +9,7 @@ urlpatterns = [
     path('pages/<int:pk>/', views.PageDetail.as_view(), name='page-detail'),
     path('pages/<int:pk>/move_page/', views.MovePageView.as_view(), name='page-move'),
     path('pagetree/', views.PageTree.as_view(), name='pagetree'),
+    path('pagetree/search/', views.PageTreeSearch.as_view(), name='pagetree-search'),
     path('contentitemgroups/', views.ContentItemGroups.as_view(), name='contentitemgroups'),
     path('page_content_items/', views.PageContentItemList.as_view(), name='pagecontentitem-list'),
     path('page_content_items/<int:pk>/', views.PageContentItemDetail.as_view(), name='pagecontentitem-detail'),
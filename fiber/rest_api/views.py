@@ -1,7 +1,12 @@
+import datetime
+
 from django.db.models import Q
 from django.db.models.deletion import ProtectedError
+from django.utils.decorators import method_decorator
 from django.utils.encoding import smart_str
 from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 
 from rest_framework import generics
 from rest_framework import renderers
@@ -14,9 +19,10 @@ from rest_framework import permissions
 
 from fiber.models import Page, PageContentItem, ContentItem, File, Image
 from fiber.app_settings import API_RENDER_HTML, PERMISSION_CLASS
+from fiber.cache import get_content_version, get_etag, get_or_build, get_page_tree_version, get_scoped_key
 from fiber.utils.import_util import load_class
 
-from .serializers import PageSerializer, MovePageSerializer, PageContentItemSerializer, MovePageContentItemSerializer, ContentItemSerializer, FileSerializer, ImageSerializer, FiberPaginationSerializer
+from .serializers import PageSerializer, MovePageSerializer, PageContentItemSerializer, MovePageContentItemSerializer, ContentItemSerializer, FileSerializer, ImageSerializer, FiberPaginationSerializer, PageTreeSearchPagination, ContentItemGroupPagination
 
 PERMISSIONS = load_class(PERMISSION_CLASS)
 
@@ -287,6 +293,7 @@ def api_root(request, format='None'):
     return Response({
             'pages': reverse('page-list', request=request),
             'pagetree': reverse('pagetree', request=request),
+            'pagetree search': reverse('pagetree-search', request=request),
             'page content items': reverse('pagecontentitem-list', request=request),
             'content items': reverse('contentitem-list', request=request),
             'images': reverse('image-list', request=request),
@@ -294,23 +301,120 @@ def api_root(request, format='None'):
     })
 
 
+def get_api_etag(request, key):
+    # The renderers share the cached data, but not their responses
+    return '%s.%s' % (get_etag(key), request.accepted_renderer.format)
+
+
+def get_pagetree_key(request, *args, **kwargs):
+    # The query parameters select the full tree or a single level
+    return get_scoped_key('pagetree', request.user, [get_page_tree_version(), sorted(request.GET.items())])
+
+
+def get_pagetree_etag(request, *args, **kwargs):
+    try:
+        int(request.query_params.get('node') or 0)
+    except ValueError:
+        # Invalid requests are answered with 400, without an ETag
+        return None
+    return get_api_etag(request, get_pagetree_key(request))
+
+
 class PageTree(views.APIView):
     renderer_classes = API_RENDERERS
     permission_classes = (permissions.IsAdminUser,)
 
+    @method_decorator(vary_on_headers('Accept'))
+    @method_decorator(condition(etag_func=get_pagetree_etag))
     def get(self, request, format=None):
         """
         Provide jqTree data for the PageSelect dialog.
+
+        With `?lazy=1` only the root nodes are returned, and jqTree loads the children of a node on demand with
+        `?node=<id>`.
+
+        The data is cached until a page changes. Requests with a matching `If-None-Match` header get a 304 response.
         """
-        return Response(Page.objects.create_jqtree_data(request.user))
+        node = request.query_params.get('node')
+        if node:
+            try:
+                parent_id = int(node)
+            except ValueError:
+                return Response('Invalid node.', status=status.HTTP_400_BAD_REQUEST)
+
+            def build():
+                return Page.objects.create_jqtree_level_data(request.user, parent_id)
+        elif request.query_params.get('lazy'):
+            def build():
+                return Page.objects.create_jqtree_level_data(request.user)
+        else:
+            def build():
+                return Page.objects.create_jqtree_data(request.user)
+        return Response(get_or_build(get_pagetree_key(request), build))
+
+
+class PageTreeSearch(generics.ListAPIView):
+    renderer_classes = API_RENDERERS
+    permission_classes = (permissions.IsAdminUser,)
+    pagination_class = PageTreeSearchPagination
+
+    def get_queryset(self):
+        return Page.objects.search(self.request.query_params.get('q', '').strip())
+
+    def list(self, request, *args, **kwargs):
+        """
+        Search pages by title or url. Returns jqTree nodes, including the ids of their ancestors.
+        """
+        pages = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(Page.objects.create_jqtree_search_data(request.user, pages))
+
+
+def get_content_groups_key(request, *args, **kwargs):
+    # The 'recently changed' group depends on the date, the query parameters select the groups or their members
+    return get_scoped_key(
+        'contentitemgroups', request.user,
+        [get_content_version(), datetime.date.today(), sorted(request.GET.items())])
+
+
+def get_content_groups_etag(request, *args, **kwargs):
+    group = request.query_params.get('group')
+    if group and group not in [slug for slug, label, group_filter in ContentItem.objects.get_content_group_filters()]:
+        # Invalid requests are answered with 400, without an ETag
+        return None
+    return get_api_etag(request, get_content_groups_key(request))
 
 
 class ContentItemGroups(views.APIView):
     renderer_classes = API_RENDERERS
     permission_classes = (permissions.IsAdminUser,)
 
+    @method_decorator(vary_on_headers('Accept'))
+    @method_decorator(condition(etag_func=get_content_groups_etag))
     def get(self, request, format=None):
         """
         Get content groups data which is suitable for jqtree.
+
+        With `?lazy=1` only the groups and their number of content items are returned. The content items in a group
+        are retrieved with `?group=<id>`, which is paginated with `&page=<number>`.
+
+        The data is cached until a content item changes. Requests with a matching `If-None-Match` header get a 304
+        response.
         """
-        return Response(ContentItem.objects.get_content_groups(request.user))
+        group = request.query_params.get('group')
+        if group:
+            try:
+                queryset = ContentItem.objects.get_content_group(group, request.user)
+            except KeyError:
+                return Response('Invalid group.', status=status.HTTP_400_BAD_REQUEST)
+
+            def build():
+                paginator = ContentItemGroupPagination()
+                content_items = paginator.paginate_queryset(queryset, request, view=self)
+                return paginator.get_paginated_response(ContentItem.objects.get_content_item_info(content_items)).data
+        elif request.query_params.get('lazy'):
+            def build():
+                return ContentItem.objects.get_content_group_counts(request.user)
+        else:
+            def build():
+                return ContentItem.objects.get_content_groups(request.user)
+        return Response(get_or_build(get_content_groups_key(request), build))
@@ -0,0 +1,76 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from mptt.signals import node_moved
+
+from . import purge
+from .cache import bump_content_version, bump_page_tree_version
+from .models import ContentItem, Page, PageContentItem
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+@receiver(node_moved, sender=Page)
+def page_tree_changed(sender, **kwargs):
+    bump_page_tree_version()
+
+
+@receiver(post_save, sender=ContentItem)
+@receiver(post_delete, sender=ContentItem)
+def content_item_changed(sender, instance, **kwargs):
+    bump_content_version(content_item_ids=[instance.pk], names=[instance.name] if instance.name else [])
+
+
+@receiver(post_save, sender=PageContentItem)
+@receiver(post_delete, sender=PageContentItem)
+def page_content_item_changed(sender, instance, **kwargs):
+    bump_content_version(page_ids=[instance.page_id])
+
+
+# The urls of changed pages, see fiber.purge. The urls before a change are retrieved right away; the urls after a
+# change once the transaction is committed, so later changes in the transaction (e.g. to descendants) are included.
+
+@receiver(pre_save, sender=Page)
+def page_will_change_urls(sender, instance, **kwargs):
+    if instance.pk and purge.is_enabled():
+        instance._fiber_changes_menus = Page.objects.changes_menus(instance)
+        purge.add_urls(Page.objects.get_affected_urls([instance.pk], menus_changed=instance._fiber_changes_menus))
+
+
+@receiver(pre_delete, sender=Page)
+def page_will_be_deleted(sender, instance, **kwargs):
+    if purge.is_enabled():
+        purge.add_urls(Page.objects.get_affected_urls([instance.pk], menus_changed=True))
+
+
+@receiver(post_save, sender=Page)
+def page_changed_urls(sender, instance, created, **kwargs):
+    page_id = instance.pk
+    # A new page is shown in the menus of the pages around it, like any other page at its position
+    menus_changed = not created and getattr(instance, '_fiber_changes_menus', True)
+    purge.add_urls(lambda: Page.objects.get_affected_urls([page_id], menus_changed=menus_changed))
+
+
+@receiver(node_moved, sender=Page)
+def page_moved_urls(sender, instance, **kwargs):
+    page_id = instance.pk
+    purge.add_urls(lambda: Page.objects.get_affected_urls([page_id], menus_changed=True))
+
+
+@receiver(pre_delete, sender=ContentItem)
+def content_item_will_change_urls(sender, instance, **kwargs):
+    if purge.is_enabled():
+        purge.add_urls(ContentItem.objects.get_page_urls([instance.pk]))
+
+
+@receiver(post_save, sender=ContentItem)
+def content_item_changed_urls(sender, instance, **kwargs):
+    content_item_id = instance.pk
+    purge.add_urls(lambda: ContentItem.objects.get_page_urls([content_item_id]))
+
+
+@receiver(post_save, sender=PageContentItem)
+@receiver(post_delete, sender=PageContentItem)
+def page_content_item_changed_urls(sender, instance, **kwargs):
+    page_id = instance.page_id
+    purge.add_urls(lambda: Page.objects.get_urls([page_id]))
@@ -29,5 +29,8 @@ class FiberSitemap(Sitemap):
     def items(self):
         return Page.objects.filter(is_public=True)
 
+    def location(self, obj):
+        return obj.absolute_url or obj.get_absolute_url()
+
     def lastmod(self, obj):
         return obj.updated
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import operator
 
@@ -7,11 +8,15 @@ from functools import reduce
 from django import template
 from django.contrib.auth.models import AnonymousUser
 from django.template import TemplateSyntaxError
+from django.template.library import InclusionNode, parse_bits
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
 import fiber
-from fiber.app_settings import AUTO_CREATE_CONTENT_ITEMS, PERMISSION_CLASS
+from fiber.app_settings import AUTO_CREATE_CONTENT_ITEMS, CONTENT_ITEM_CACHE, LOCAL_CACHE, MENU_CACHE, PERMISSION_CLASS
+from fiber.cache import (
+    add_dependencies, get_cache, get_content_item_version_key, get_content_name_version_key,
+    get_page_content_version_key, get_page_tree_version)
 from fiber.models import ContentItem, Page
 from fiber.utils.import_util import load_class
 from fiber.utils.urls import get_admin_change_url
@@ -21,6 +26,16 @@ PERMISSIONS = load_class(PERMISSION_CLASS)
 register = template.Library()
 
 
+def get_fiber_page(context):
+    """
+    Get the fiber page of the context. Falls back to `request.fiber_page` (see FiberPageMiddleware), so the tags also
+    work in templates of views that don't add fiber_page to the context.
+    """
+    if 'fiber_page' in context:
+        return context['fiber_page']
+    return getattr(context.get('request'), 'fiber_page', None) or None
+
+
 class MenuHelper:
     """
     Helper class for show_menu tag, for convenience/clarity
@@ -122,7 +137,7 @@ class MenuHelper:
         Get the menu tree
         """
         root = self.get_root()
-        current = self.context.get('fiber_page')
+        current = get_fiber_page(self.context)
         if self.expand == 'all':
             # Unfiltered sitemap like tree
             tree = self.get_tree(root)
@@ -145,14 +160,98 @@ class MenuHelper:
         return tree
 
 
-@register.inclusion_tag('fiber/menu.html', takes_context=True)
+class SnapshotMenuHelper(MenuHelper):
+    """
+    MenuHelper that builds the menu from the in-memory page tree snapshot, instead of querying the database
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.snapshot = Page.objects.get_tree_snapshot()
+
+    def get_root(self):
+        root = self.snapshot.get_root(self.menu_name)
+        if root is None:
+            raise Page.DoesNotExist("Menu does not exist.\nNo top-level page found with the title '%s'." % self.menu_name)
+        return self.snapshot.copy_pages([root])[0]
+
+    def get_snapshot_tree(self, root):
+        """
+        Get the snapshot pages from the root page, limited to max_level
+        """
+        return [p for p in self.snapshot.get_descendants(root, include_self=True) if p.level <= self.max_level]
+
+    def get_tree(self, root):
+        return self.snapshot.copy_pages(self.get_snapshot_tree(root))
+
+    def get_tree_for_page(self, root, page):
+        """
+        Get a tree, taking a specific page into account. Mirrors MenuHelper.get_tree_for_page.
+        """
+        if page:
+            page = self.snapshot.get(page.id)
+        if not page or not page.is_child_of(root):
+            if self.min_level == 1:
+                return self.snapshot.copy_pages(p for p in self.get_snapshot_tree(root) if p.level <= 1)
+            else:
+                return []
+        if page.level + 1 < self.min_level:
+            return []
+
+        ancestor_ids = set(p.id for p in self.snapshot.get_ancestors(page))
+
+        def in_menu(p):
+            if p.lft < page.lft and p.rght > page.rght:
+                return True  # the 'route' to the current page
+            if p.parent_id in ancestor_ids:
+                return True  # siblings of anything in the route
+            if p.lft > page.lft and p.rght < page.rght:
+                # children
+                return self.expand == 'all_descendants' or p.level == page.level + 1
+            return False
+
+        return self.snapshot.copy_pages(p for p in self.get_snapshot_tree(root) if in_menu(p))
+
+
+def get_menu_cache_key(context, menu_name, min_level, max_level, expand):
+    """
+    Get the cache key for a rendered menu. Includes the page tree version, so a cached menu is not used anymore
+    once any page has changed.
+    """
+    user = context.get('user')
+    fiber_page = get_fiber_page(context)
+    current_pages = context.get('fiber_current_pages') or []
+    key = json.dumps([
+        get_page_tree_version(),
+        menu_name, min_level, max_level, expand,
+        fiber_page.pk if fiber_page else None,
+        sorted(page.pk for page in current_pages),
+        # Staff users see editable menus that depend on their permissions
+        user.pk if user and user.is_staff else None,
+    ])
+    return 'fiber:menu:%s' % hashlib.md5(key.encode()).hexdigest()
+
+
+def render_menu(context, menu_name, min_level, max_level, expand):
+    menu_helper_class = SnapshotMenuHelper if LOCAL_CACHE else MenuHelper
+    menu_context = copy(context)
+    menu_context.update(menu_helper_class(context, menu_name, min_level, max_level, expand).get_context_data())
+    return context.template.engine.get_template('fiber/menu.html').render(context.new(menu_context))
+
+
+@register.simple_tag(takes_context=True)
 def show_menu(context, menu_name, min_level, max_level, expand=None):
-    context = copy(context)
-    context.update(MenuHelper(context, menu_name, min_level, max_level, expand).get_context_data())
-    return context
+    if not MENU_CACHE:
+        return render_menu(context, menu_name, min_level, max_level, expand)
+
+    cache = get_cache()
+    cache_key = get_menu_cache_key(context, menu_name, min_level, max_level, expand)
+    menu = cache.get(cache_key)
+    if menu is None:
+        menu = render_menu(context, menu_name, min_level, max_level, expand)
+        cache.set(cache_key, menu)
+    return mark_safe(menu)
 
 
-@register.inclusion_tag('fiber/content_item.html', takes_context=True)
 def show_content(context, content_item_name):
     """
     Fetch and render a named content item. If FIBER_AUTO_CREATE_CONTENT_ITEMS = True and the content item does not
@@ -160,18 +259,62 @@ def show_content(context, content_item_name):
 
     {% show_content "block_name" %}
     """
-    content_item = None
-    try:
-        content_item = ContentItem.objects.get(name__exact=content_item_name)
-    except ContentItem.DoesNotExist:
-        if AUTO_CREATE_CONTENT_ITEMS:
-            content_item = ContentItem.objects.create(name=content_item_name)
+    content_item = get_named_content_items(context, [content_item_name])[content_item_name]
 
     context = copy(context)
     context.update({'content_item': content_item})
     return context
 
 
+def get_named_content_items(context, content_item_names):
+    """
+    Return a dict that maps the given names to content items. Content items are retrieved once per template render;
+    all names that aren't known yet are retrieved in one query.
+    """
+    content_items = context.render_context.setdefault('fiber_content_items', {})
+    missing_names = [name for name in content_item_names if name not in content_items]
+    if missing_names:
+        content_items.update(ContentItem.objects.get_by_names(missing_names, create=AUTO_CREATE_CONTENT_ITEMS))
+
+    add_dependencies(getattr(context, 'request', None), [
+        get_content_item_version_key(content_items[name].pk) if content_items[name] else
+        get_content_name_version_key(name)
+        for name in content_item_names])
+    return content_items
+
+
+class ShowContentNode(InclusionNode):
+    """
+    Node for the show_content tag. The content items named by all show_content tags in the same template are
+    retrieved together, when the first of these tags is rendered.
+    """
+    def __init__(self, content_item_names, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.content_item_names = content_item_names
+
+    def render(self, context):
+        content_item_name = self.args[0].resolve(context)
+        get_named_content_items(context, [content_item_name] + sorted(self.content_item_names))
+        return super().render(context)
+
+
+@register.tag(name='show_content')
+def do_show_content(parser, token):
+    bits = token.split_contents()
+    args, kwargs = parse_bits(
+        parser, bits[1:], ['context', 'content_item_name'], None, None, None, [], {}, True, bits[0])
+
+    # Collect the literal names of the show_content tags in this template
+    if not hasattr(parser, 'fiber_content_item_names'):
+        parser.fiber_content_item_names = set()
+    content_item_name = args[0]
+    if isinstance(content_item_name.var, str) and not content_item_name.filters:
+        parser.fiber_content_item_names.add(content_item_name.var)
+
+    return ShowContentNode(
+        parser.fiber_content_item_names, show_content, True, args, kwargs, 'fiber/content_item.html')
+
+
 @register.inclusion_tag('fiber/content_items.html', takes_context=True)
 def show_page_content(context, page_or_block_name, block_name=None):
     """
@@ -184,10 +327,7 @@ def show_page_content(context, page_or_block_name, block_name=None):
     if isinstance(page_or_block_name, str) and block_name is None:
         # Single argument e.g. {% show_page_content 'main' %}
         block_name = page_or_block_name
-        try:
-            page = context['fiber_page']
-        except KeyError:
-            page = None
+        page = get_fiber_page(context)
     elif (page_or_block_name is None or isinstance(page_or_block_name, Page)) and block_name:
         # Two arguments e.g. {% show_page_content other_page 'main' %}
         page = page_or_block_name
@@ -196,12 +336,10 @@ def show_page_content(context, page_or_block_name, block_name=None):
         raise TemplateSyntaxError("'show_page_content' received invalid arguments")
 
     if page and block_name:
-        page_content_items = page.page_content_items.filter(block_name=block_name).order_by('sort').select_related('content_item')
-        content_items = []
-        for page_content_item in page_content_items:
-            content_item = page_content_item.content_item
-            content_item.page_content_item = page_content_item
-            content_items.append(content_item)
+        # All blocks of the page are retrieved at once, so other show_page_content tags don't need a query
+        content_items = page.get_content_blocks().get(block_name, [])
+        add_dependencies(getattr(context, 'request', None), [get_page_content_version_key(page.pk)] + [
+            get_content_item_version_key(content_item.pk) for content_item in content_items])
 
         context = copy(context)
         context.update({
@@ -213,6 +351,46 @@ def show_page_content(context, page_or_block_name, block_name=None):
         return context
 
 
+def get_content_item_cache_key(context, content_item):
+    """
+    Get the cache key for the rendered output of a content item. Saving the content item changes its `updated`
+    timestamp, so the cached output is not used anymore.
+    """
+    user = context.get('user')
+    key = json.dumps([
+        content_item.pk,
+        content_item.updated.isoformat(),
+        content_item.template_name,
+        bool(user and user.is_staff),
+    ])
+    return 'fiber:content_item:%s' % hashlib.md5(key.encode()).hexdigest()
+
+
+@register.simple_tag(takes_context=True)
+def render_content_item(context, content_item):
+    """
+    Render the contents of a content item, using its template if it has one.
+
+    {% render_content_item content_item %}
+    """
+    if not content_item.template_name:
+        return mark_safe(content_item.content_html)
+
+    def render():
+        return context.template.engine.get_template(content_item.template_name).render(context)
+
+    if not CONTENT_ITEM_CACHE:
+        return render()
+
+    cache = get_cache()
+    cache_key = get_content_item_cache_key(context, content_item)
+    output = cache.get(cache_key)
+    if output is None:
+        output = render()
+        cache.set(cache_key, output)
+    return mark_safe(output)
+
+
 @register.tag(name='captureas')
 def do_captureas(parser, token):
     try:
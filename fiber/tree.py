@@ -0,0 +1,101 @@
+import re
+from copy import copy
+
+
+# Inline flags like `(?i)` apply to the entire pattern; before Python 3.11 they are also accepted after the start
+GLOBAL_FLAGS_RE = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+def compile_regexes(regexes):
+    """
+    Compile a list of regexes into as few patterns as possible. Any of the returned patterns matches if one of the
+    regexes matches.
+
+    Regexes that contain groups are compiled separately, so their backreferences keep working, and so are regexes
+    with inline flags, so their flags don't apply to the other regexes.
+    """
+    patterns = [re.compile(regex) for regex in regexes]
+    if len(patterns) > 1 and not any(pattern.groups or GLOBAL_FLAGS_RE.search(pattern.pattern) for pattern in patterns):
+        try:
+            return [re.compile('|'.join('(?:%s)' % pattern.pattern for pattern in patterns))]
+        except re.error:
+            pass  # e.g. inline flags that aren't at the start of the combined pattern
+    return patterns
+
+
+class MarkCurrentMatcher:
+    """
+    Finds the pages whose `mark_current_regexes` match a url, using regexes that are compiled only once.
+    """
+
+    def __init__(self, pages):
+        self._candidates = []
+        regexes = []
+        for page in pages:
+            if page.mark_current_regexes:
+                page_regexes = [regex.strip() for regex in page.mark_current_regexes.strip().splitlines()]
+                self._candidates.append((page, compile_regexes(page_regexes)))
+                regexes.extend(page_regexes)
+
+        # Most urls don't match any of the regexes; a single combined pattern rejects those quickly.
+        self._any_patterns = compile_regexes(regexes)
+
+    def get_pages(self, url):
+        if not any(pattern.match(url) for pattern in self._any_patterns):
+            return []
+        return [page for page, patterns in self._candidates if any(pattern.match(url) for pattern in patterns)]
+
+
+class PageTreeSnapshot:
+    """
+    An in-memory copy of the entire page tree, built from a single query.
+
+    The snapshot is shared between requests and must not be modified; the pages it returns are copies that may be
+    modified freely (e.g. by `PageManager.link_parent_objects` or mptt's `recursetree`).
+    """
+
+    def __init__(self, pages):
+        # The pages must be in tree order (tree_id, lft), so the descendants of a page directly follow it.
+        self._pages = tuple(pages)
+        self._positions = {page.id: position for position, page in enumerate(self._pages)}
+        self._mark_current_matcher = None
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, page_id):
+        position = self._positions.get(page_id)
+        return None if position is None else self._pages[position]
+
+    def get_root(self, title):
+        for page in self._pages:
+            if page.parent_id is None and page.title == title:
+                return page
+
+    def get_ancestors(self, page):
+        ancestors = []
+        while page.parent_id is not None:
+            page = self.get(page.parent_id)
+            ancestors.insert(0, page)
+        return ancestors
+
+    def get_descendants(self, page, include_self=False):
+        position = self._positions[page.id]
+        end = position + 1 + (page.rght - page.lft - 1) // 2
+        if not include_self:
+            position += 1
+        return self._pages[position:end]
+
+    def get_mark_current_pages(self, url):
+        """
+        Return the snapshot pages whose `mark_current_regexes` match `url`.
+        """
+        if self._mark_current_matcher is None:
+            self._mark_current_matcher = MarkCurrentMatcher(self._pages)
+        return self._mark_current_matcher.get_pages(url)
+
+    def copy_pages(self, pages):
+        """
+        Return copies of the given snapshot pages.
+        """
+        return [copy(page) for page in pages]
@@ -39,7 +39,7 @@ class FiberMarkupField(FiberTextField):
         if editor.renderer:
             # also save html
             html_field_name = self.name.replace('_markup', '_html')
-            setattr(model_instance, html_field_name, editor.renderer(value))
+            setattr(model_instance, html_field_name, editor.render(value))
         return value
 
 
@@ -51,7 +51,7 @@ class FiberHTMLField(FiberTextField):
             # render the markup to get the html
             markup_field_name = self.name.replace('_html', '_markup')
             markup = getattr(model_instance, markup_field_name)
-            return editor.renderer(markup)
+            return editor.render(markup)
 
 
 FORMFIELD_FOR_DBFIELD_DEFAULTS[FiberMarkupField] = {'widget': FiberTextarea}
@@ -2,10 +2,13 @@ import re
 
 import html.entities as html_entities
 
+from django.utils.html import strip_tags
+
 
 name2codepoint = html_entities.name2codepoint.copy()
 name2codepoint['apos'] = ord("'")
 
+_HREF = re.compile(r"""\shref=(?:"([^"]*)"|'([^']*)')""")
 _ENTITY_REF = re.compile(r'&(?:#(\d+)|(?:#x([\da-fA-F]+))|([a-zA-Z]+));')
 _ENTITY_REPLACE = [
     lambda code: chr(int(code, 10)) if code else None,
@@ -21,3 +24,142 @@ def htmlentitydecode(s):
                 return replaced
         return match.group(0)
     return _ENTITY_REF.sub(unescape, s)
+
+
+def get_hrefs(html):
+    """
+    Return the set of urls that the links in `html` point to.
+    """
+    return {double_quoted or single_quoted for double_quoted, single_quoted in _HREF.findall(html or '')}
+
+
+def get_summary(html, length=50):
+    """
+    Return the text of `html`, with normalized whitespace, shortened to `length` characters.
+    """
+    text = ' '.join(htmlentitydecode(strip_tags(html or '')).split())
+    if len(text) > length:
+        text = text[:length] + '...'
+    return text
+
+
+class HtmlInjector:
+    """
+    Injects html into an (encoded) html document in a single pass, without decoding it:
+
+    - `head_html` before the first `</head>` after `<head>`
+    - `body_attrs` into the first `<body ...>` tag after that, directly after `<body`
+    - `body_start_html` directly after that tag
+    - `body_end_html` before the last `</body>`
+
+    The document can be fed in chunks, in which case only a few bytes of a chunk are held back to find markers that
+    are split over two chunks; the part from `</head>` up to the end of the `<body ...>` tag, so the html injected
+    there is only sent if the document has a body; and, once found, everything after the last `</body>` (usually just
+    `</html>`).
+    """
+    HEAD = b'<head>'
+    HEAD_END = b'</head>'
+    BODY = b'<body'
+    BODY_TAG_END = b'>'
+    BODY_END = b'</body>'
+
+    def __init__(self, head_html=b'', body_attrs=b'', body_start_html=b'', body_end_html=b''):
+        self._head_html = head_html
+        self._body_attrs = body_attrs
+        self._body_start_html = body_start_html
+        self._body_end_html = body_end_html
+        self._buffer = b''
+        self._has_head = False
+        self._has_body = False
+        self._has_body_end = False
+
+    @property
+    def is_complete(self):
+        """
+        True if all markers were found.
+        """
+        return self._has_body and self._has_body_end
+
+    def feed(self, chunk):
+        """
+        Return the part of the document that can be sent, up to and including `chunk`.
+        """
+        buffer = self._buffer + chunk
+        parts = []
+        start = 0
+        if not self._has_head:
+            index = buffer.find(self.HEAD)
+            if index == -1:
+                return self._hold_back(buffer, parts, start, len(buffer) - len(self.HEAD) + 1)
+            start = index + len(self.HEAD)
+            parts.append(buffer[:start])
+            self._has_head = True
+
+        if not self._has_body:
+            head_end = buffer.find(self.HEAD_END, start)
+            if head_end == -1:
+                return self._hold_back(buffer, parts, start, len(buffer) - len(self.HEAD_END) + 1)
+            body = buffer.find(self.BODY, head_end + len(self.HEAD_END))
+            tag_end = -1 if body == -1 else buffer.find(self.BODY_TAG_END, body + len(self.BODY))
+            if tag_end == -1:
+                return self._hold_back(buffer, parts, start, head_end)
+            body += len(self.BODY)
+            tag_end += len(self.BODY_TAG_END)
+            parts.extend([
+                buffer[start:head_end], self._head_html, buffer[head_end:body], self._body_attrs,
+                buffer[body:tag_end], self._body_start_html,
+            ])
+            start = tag_end
+            self._has_body = True
+
+        index = buffer.rfind(self.BODY_END, start)
+        if index != -1:
+            self._has_body_end = True
+        elif not self._has_body_end:
+            index = len(buffer) - len(self.BODY_END) + 1
+        else:
+            # Hold back everything after the last `</body>`, a later chunk may contain another one
+            index = start
+        return self._hold_back(buffer, parts, start, index)
+
+    def _hold_back(self, buffer, parts, start, end):
+        end = max(start, end)
+        parts.append(buffer[start:end])
+        self._buffer = buffer[end:]
+        return b''.join(parts)
+
+    def close(self):
+        """
+        Return the rest of the document.
+
+        If the html at the start of the body has been sent, but the document has no `</body>` (which is optional),
+        the html for the end of the body is added at the end of the document.
+        """
+        buffer, self._buffer = self._buffer, b''
+        if self.is_complete:
+            return self._body_end_html + buffer
+        if self._has_body:
+            return buffer + self._body_end_html
+        return buffer
+
+    def inject(self, content):
+        """
+        Return `content` with the html injected, or unchanged if not all markers were found.
+        """
+        injected = self.feed(content) + self.close()
+        return injected if self.is_complete else content
+
+    def stream(self, chunks):
+        """
+        Yield the chunks of a document with the html injected on the fly.
+
+        Html that has been sent can't be taken back, so unlike `inject` this injects the html into a document that
+        has a body without `</body>`; the html for the end of the body is then added at the end of the document.
+        """
+        for chunk in chunks:
+            part = self.feed(chunk)
+            if part:
+                yield part
+        part = self.close()
+        if part:
+            yield part
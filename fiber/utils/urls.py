@@ -9,11 +9,14 @@ def get_admin_change_url(instance):
     return reverse(named_url, args=(instance.pk,))
 
 
-# PageManager.get_by_url duplicates this logic for efficient DB use
 def is_quoted_url(quoted_url):
     return quoted_url.startswith('"') and quoted_url.endswith('"')
 
 
+def is_relative_url(url):
+    return bool(url) and not url.startswith(('/', 'http://', 'https://')) and not is_quoted_url(url)
+
+
 def get_named_url_from_quoted_url(quoted_url):
     if is_quoted_url(quoted_url):
         named_url = quoted_url.strip('"')
@@ -23,3 +26,28 @@ def get_named_url_from_quoted_url(quoted_url):
             return False
     else:
         return False
+
+
+def get_absolute_page_url(url, parent_url=None):
+    """
+    Return the absolute url for the page `url`. Relative urls are joined to `parent_url`, the absolute url
+    of the parent page (None for pages without a parent).
+    """
+    if is_relative_url(url):
+        if parent_url is None:
+            return ''  # TODO: make sure this can never happen (in model.save()?)
+        return '{}/{}/'.format(parent_url.rstrip('/'), url.strip('/'))
+    elif is_quoted_url(url):
+        return get_named_url_from_quoted_url(url)
+    else:
+        return url
+
+
+def has_named_page_url(url, parent_has_named_url=False):
+    """
+    Return whether the absolute url of a page with `url` is a named url (e.g. `"shop"`), or is relative to one.
+
+    Named urls depend on the active language and the url conf, so they are reversed when they are needed instead of
+    stored in `Page.absolute_url`.
+    """
+    return is_quoted_url(url) or (parent_has_named_url and is_relative_url(url))
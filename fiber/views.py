@@ -1,13 +1,130 @@
+import hashlib
+import json
+
 from django.conf import settings
+from django.db.models import Max
 from django.http import HttpResponsePermanentRedirect, Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
 from django.views.generic.base import TemplateView
 
-from .app_settings import DEFAULT_TEMPLATE
+from .app_settings import CONDITIONAL_PAGES, DEFAULT_TEMPLATE, PAGE_CACHE, PAGE_CACHE_TIMEOUT
+from .cache import (
+    CONTENT_MODIFIED_KEY, CONTENT_VERSION_KEY, PAGE_TREE_MODIFIED_KEY, PAGE_TREE_VERSION_KEY, cache_response,
+    get_cached_response, get_modified, get_versions)
 from .mixins import FiberPageMixin
+from .models import Page
 
 
 class FiberTemplateView(FiberPageMixin, TemplateView):
 
+    def get(self, request, *args, **kwargs):
+        # With FIBER_LOCAL_CACHE, redirect pages are served from the redirect map, without queries
+        redirect_url = Page.objects.get_redirect_url(self.get_fiber_page_url())
+        if redirect_url:
+            return HttpResponsePermanentRedirect(redirect_url)
+
+        use_page_cache = self.use_page_cache()
+        if use_page_cache:
+            response = get_cached_response(request)
+            if response is not None:
+                # The validators of a cached response answer conditional requests without any queries
+                return get_conditional_response(
+                    request, etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(response.get('Last-Modified')), response=response)
+
+        validators = self.get_fiber_page_validators() if self.use_conditional_get() else None
+        if validators:
+            etag, last_modified = quote_etag(validators[0]), int(validators[1])
+            # Answer before the page is rendered
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+
+        if use_page_cache:
+            response = self.get_for_page_cache(request, *args, **kwargs)
+        else:
+            response = super().get(request, *args, **kwargs)
+        if validators:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_for_page_cache(self, request, *args, **kwargs):
+        """
+        Build the response, and cache it once it's rendered.
+        """
+        # Every page shows the page tree (e.g. in menus). Template tags add the content that the page shows.
+        request._fiber_dependencies = {PAGE_TREE_VERSION_KEY}
+        # Retrieved before the page is built, to notice changes that are made while it's built
+        initial_versions = get_versions([PAGE_TREE_VERSION_KEY, CONTENT_VERSION_KEY])
+        response = super().get(request, *args, **kwargs)
+
+        def store(response):
+            versions = get_versions(list(initial_versions) + sorted(request._fiber_dependencies))
+            changed = any(versions[key] != version for key, version in initial_versions.items())
+            if not changed and self.is_cacheable_response(response):
+                cache_response(
+                    request, response, {key: versions[key] for key in request._fiber_dependencies},
+                    PAGE_CACHE_TIMEOUT)
+
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(store)
+        return response
+
+    def use_conditional_get(self):
+        """
+        Conditional requests (FIBER_CONDITIONAL_PAGES) are answered for GET and HEAD requests of anonymous users.
+        """
+        return (
+            CONDITIONAL_PAGES and self.request.method in ('GET', 'HEAD') and not self.request.user.is_authenticated)
+
+    def get_fiber_page_validators(self):
+        """
+        Return the ETag (unquoted) and the last modified time (a timestamp) of the response, or None if the response
+        has no validators, e.g. because there's no page or it redirects.
+
+        The validators cover the page, the page tree (shown in menus) and all content items, which may be shown in
+        content blocks and by `show_content` tags; this takes one query. Override this method to include other data
+        that the template shows.
+        """
+        page = self.get_fiber_page()
+        if page is None or page.redirect_page_id or not page.is_public_for_user(self.request.user):
+            return None
+        content_updated = page.page_content_items.aggregate(updated=Max('content_item__updated'))['updated']
+        versions = get_versions([PAGE_TREE_VERSION_KEY, CONTENT_VERSION_KEY])
+        etag = hashlib.md5(json.dumps([
+            page.pk, versions[PAGE_TREE_VERSION_KEY], versions[CONTENT_VERSION_KEY], content_updated
+        ], default=str).encode()).hexdigest()
+        # Pages that are removed from the page, or from menus, don't change `updated`
+        modified = [page.updated.timestamp(), get_modified([PAGE_TREE_MODIFIED_KEY, CONTENT_MODIFIED_KEY])]
+        if content_updated:
+            modified.append(content_updated.timestamp())
+        return etag, max(modified)
+
+    def use_page_cache(self):
+        """
+        The page cache (FIBER_PAGE_CACHE) is used for GET and HEAD requests of anonymous users.
+        """
+        return PAGE_CACHE and self.request.method in ('GET', 'HEAD') and not self.request.user.is_authenticated
+
+    def is_cacheable_response(self, response):
+        """
+        Responses that are specific to the request, e.g. because they contain a CSRF token or messages, aren't cached.
+        """
+        request = self.request
+        session = getattr(request, 'session', None)
+        # Django < 4.1 marks the use of a CSRF token with CSRF_COOKIE_USED, later versions with CSRF_COOKIE_NEEDS_UPDATE
+        uses_csrf_token = request.META.get('CSRF_COOKIE_USED') or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        # The session isn't modified by reading messages until the response has passed MessageMiddleware
+        messages = getattr(request, '_messages', None)
+        shows_messages = messages is not None and messages.used and len(messages)
+        return (
+            request.method == 'GET' and response.status_code == 200 and not response.cookies and
+            'private' not in response.get('Cache-Control', '') and not uses_csrf_token and not shows_messages and
+            not (session is not None and session.modified)
+        )
+
     def get_fiber_page_url(self):
         return self.request.path_info
 
@@ -32,7 +149,9 @@ class FiberTemplateView(FiberPageMixin, TemplateView):
                 raise Http404
 
             if fiber_page.redirect_page and fiber_page.redirect_page != fiber_page:  # prevent redirecting to itself
-                return HttpResponsePermanentRedirect(fiber_page.redirect_page.get_absolute_url())
+                redirect_page = fiber_page.redirect_page
+                # The stored absolute url saves the queries for the ancestors of the redirect page
+                return HttpResponsePermanentRedirect(redirect_page.absolute_url or redirect_page.get_absolute_url())
 
         return super().render_to_response(*args, **kwargs)
 
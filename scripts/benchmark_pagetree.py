@@ -0,0 +1,92 @@
+"""
+Benchmark building the jqtree data of the page tree, for trees of 1k to 100k pages.
+
+Run from the root of the repository:
+
+    python scripts/benchmark_pagetree.py [size ...]
+
+The time per page should stay roughly the same as the tree grows.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testproject'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'testproject.settings')
+
+SIZES = [int(size) for size in sys.argv[1:]] or [1000, 10000, 100000]
+
+
+
+def create_tree(size, branching=10):
+    """
+    Create a page tree of `size` pages with `bulk_create`, filling in the mptt fields.
+    """
+    from fiber.models import Page
+
+    pages = []
+
+    def add_page(parent, level, number, tree_id):
+        page = Page(
+            id=len(pages) + 1, parent_id=parent.id if parent else None, title='page %s' % number,
+            url='page-%s' % number if parent else '', tree_id=tree_id, level=level)
+        pages.append(page)
+        return page
+
+    # Breadth-first, so the tree is balanced
+    root = add_page(None, 0, 0, 1)
+    queue = [root]
+    children = {root.id: []}
+    while len(pages) < size:
+        parent = queue.pop(0)
+        for i in range(branching):
+            if len(pages) >= size:
+                break
+            page = add_page(parent, parent.level + 1, len(pages), 1)
+            children[parent.id].append(page)
+            children[page.id] = []
+            queue.append(page)
+
+    def number(page, counter, parent_url):
+        page.absolute_url = '%s%s/' % (parent_url, page.url) if page.url else ''
+        page.lft = counter
+        counter += 1
+        for child in children[page.id]:
+            counter = number(child, counter, page.absolute_url or '/')
+        page.rght = counter
+        return counter + 1
+
+    sys.setrecursionlimit(10000)
+    number(root, 1, '/')
+    Page.objects.bulk_create(pages, batch_size=1000)
+
+
+def main():
+    import django
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from fiber.models import Page
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        print('%10s %10s %15s' % ('pages', 'seconds', 'us per page'))
+        for size in SIZES:
+            Page.objects.all().delete()
+            create_tree(size)
+            start = time.perf_counter()
+            Page.objects.create_jqtree_data(user)
+            duration = time.perf_counter() - start
+            print('%10d %10.3f %15.1f' % (size, duration, duration / size * 1000000))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
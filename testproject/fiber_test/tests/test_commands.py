@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from fiber.models import Page
+
+
+class TestUpdateAbsoluteUrls(TestCase):
+    def setUp(self):
+        home = Page.objects.create(title='home')
+        section = Page.objects.create(title='section', parent=home, url='section')
+        Page.objects.create(title='abc', parent=section, url='abc')
+
+        # Simulate out of date absolute urls
+        Page.objects.filter(title__in=['section', 'abc']).update(absolute_url='')
+
+    def test_check(self):
+        """Reports out of date urls, without changing them"""
+        stdout = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('fiber_update_absolute_urls', check=True, stdout=stdout)
+        self.assertIn('section -> /section/', stdout.getvalue())
+        self.assertIn('abc -> /section/abc/', stdout.getvalue())
+        self.assertEqual(Page.objects.get(title='abc').absolute_url, '')
+
+    def test_update(self):
+        """Updates out of date urls"""
+        call_command('fiber_update_absolute_urls', stdout=StringIO())
+        self.assertEqual(Page.objects.get(title='section').absolute_url, '/section/')
+        self.assertEqual(Page.objects.get(title='abc').absolute_url, '/section/abc/')
+
+        stdout = StringIO()
+        call_command('fiber_update_absolute_urls', check=True, stdout=stdout)
+        self.assertIn('All stored absolute urls are up to date.', stdout.getvalue())
+
+
+class TestFlattenRedirects(TestCase):
+    def setUp(self):
+        self.home = Page.objects.create(title='home')
+        self.newest = Page.objects.create(title='newest', parent=self.home, url='newest')
+        self.newer = Page.objects.create(title='newer', parent=self.home, url='newer', redirect_page=self.newest)
+        self.old = Page.objects.create(title='old', parent=self.home, url='old', redirect_page=self.newer)
+
+    def test_check(self):
+        """Reports redirect chains, without changing them"""
+        stdout = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('fiber_flatten_redirects', check=True, stdout=stdout)
+        self.assertIn(f'{self.old.id}: old -> {self.newest.id}', stdout.getvalue())
+        self.assertEqual(Page.objects.get(title='old').redirect_page, self.newer)
+
+    def test_flatten(self):
+        """Redirects to the last page of a chain"""
+        call_command('fiber_flatten_redirects', stdout=StringIO())
+        self.assertEqual(Page.objects.get(title='old').redirect_page, self.newest)
+        self.assertEqual(Page.objects.get(title='newer').redirect_page, self.newest)
+
+        stdout = StringIO()
+        call_command('fiber_flatten_redirects', check=True, stdout=stdout)
+        self.assertIn('There are no redirect chains.', stdout.getvalue())
+
+    def test_loops(self):
+        """Reports and skips redirect loops"""
+        self.newest.redirect_page = self.old
+        self.newest.save()
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command('fiber_flatten_redirects', stdout=stdout, stderr=stderr)
+        self.assertIn(f'Redirect loop: {self.newest.id}, {self.newer.id}, {self.old.id}', stderr.getvalue())
+        self.assertEqual(Page.objects.get(title='old').redirect_page, self.newer)
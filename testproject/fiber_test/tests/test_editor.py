@@ -0,0 +1,46 @@
+from django.test import TestCase
+
+from fiber import editor
+from fiber.models import ContentItem
+
+
+def upper_renderer(markup):
+    upper_renderer.calls += 1
+    return '<p>%s</p>' % markup.upper()
+
+
+class TestRender(TestCase):
+    def setUp(self):
+        self._renderer = editor.renderer
+        self._markup_cache = editor.MARKUP_CACHE
+        editor.renderer = upper_renderer
+        editor.rendered_markup.clear()
+        upper_renderer.calls = 0
+
+    def tearDown(self):
+        editor.renderer = self._renderer
+        editor.MARKUP_CACHE = self._markup_cache
+
+    def test_render(self):
+        """Unchanged markup is rendered once"""
+        self.assertEqual(editor.render('text'), '<p>TEXT</p>')
+        self.assertEqual(editor.render('text'), '<p>TEXT</p>')
+        self.assertEqual(editor.render('other'), '<p>OTHER</p>')
+        self.assertEqual(upper_renderer.calls, 2)
+
+    def test_save(self):
+        """The markup and html fields share one render"""
+        content_item = ContentItem.objects.create(content_markup='text')
+        self.assertEqual(content_item.content_html, '<p>TEXT</p>')
+        self.assertEqual(upper_renderer.calls, 1)
+
+        content_item.save()
+        self.assertEqual(upper_renderer.calls, 1)
+
+    def test_markup_cache(self):
+        """Rendered markup is shared through the cache"""
+        editor.MARKUP_CACHE = True
+        editor.render('shared')
+        editor.rendered_markup.clear()
+        self.assertEqual(editor.render('shared'), '<p>SHARED</p>')
+        self.assertEqual(upper_renderer.calls, 1)
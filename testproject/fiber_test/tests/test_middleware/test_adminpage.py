@@ -3,13 +3,16 @@ from unittest import skipUnless
 
 from django.contrib.auth.models import AnonymousUser, User
 from django.http import HttpResponse, StreamingHttpResponse
+from django.db import connection
 from django.test import RequestFactory, TestCase, SimpleTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils.encoding import force_str
 
 import fiber.middleware
 
-from fiber.middleware import AdminPageMiddleware
+from fiber.middleware import AdminPageMiddleware, FiberPageMiddleware
 from fiber.models import ContentItem, Page, PageContentItem
+from fiber.utils.html import HtmlInjector
 
 middleware = AdminPageMiddleware(lambda: None)
 
@@ -62,13 +65,14 @@ class TestAtFiberLoginRedirect(TestCase):
         self.assertNotIn(middleware.LOGIN_SESSION_KEY, request.session)
 
     @skipUnless(StreamingHttpResponse, 'StreamingHttpResponse is not available')
-    def test_skips_streaming(self):
-        """Streaming responses don't get touched"""
-        request = self.client.get('/@fiber')
+    def test_streaming(self):
+        """Middleware also sets up the login session for streaming responses"""
+        request = RequestFactory().get('/@fiber')
         request.session = {}
         response = StreamingHttpResponse('')
-        middleware.process_response(request, response)
-        self.assertNotIn(middleware.LOGIN_SESSION_KEY, request.session)
+        response = middleware.process_response(request, response)
+        self.assertTrue(request.session[middleware.LOGIN_SESSION_KEY])
+        self.assertEqual(response.status_code, 302)
 
 
 class TestModifiedResponse(TestCase):
@@ -102,6 +106,15 @@ class TestModifiedResponse(TestCase):
         expected = '<body data-fiber-data="{&quot;frontend&quot;: true, &quot;page_id&quot;: %s}"' % self.page.pk
         self.assertRegex(force_str(response.content), expected)
 
+    def test_page_lookup_shared_with_view(self):
+        """
+        The middleware reuses the page that the view looked up
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.page.get_absolute_url())
+        page_queries = [query for query in queries if '"fiber_page"."absolute_url" =' in query['sql']]
+        self.assertEqual(len(page_queries), 1)
+
     def test_adds_sidebar(self):
         response = self.client.get('/empty/')
         self.assertIn('<div id="df-sidebar">', force_str(response.content))
@@ -116,6 +129,92 @@ class TestModifiedResponse(TestCase):
         response = StreamingHttpResponse(content)
         self.assertEqual(''.join(middleware.process_response(request, response)), content)
 
+    def test_streaming(self):
+        """
+        Streaming responses are modified on the fly, also when the tags are split over chunks
+        """
+        request = RequestFactory().get(self.page.get_absolute_url())
+        request.user = self.staff
+        request.session = {}
+        chunks = ['<html><he', 'ad><title>home</title></h', 'ead><body class="', 'home"><p>lorem ipsum</p></bo', 'dy></html>']
+        response = StreamingHttpResponse(chunks)
+        response['Content-Length'] = str(len(''.join(chunks)))
+        response = middleware.process_response(request, response)
+        self.assertNotIn('Content-Length', response)
+        content = force_str(b''.join(response.streaming_content))
+        self.assertRegex(content, re.compile('<title>home</title>.*admin.css.*</head><body', re.DOTALL))
+        expected = '<body data-fiber-data="{&quot;frontend&quot;: true, &quot;page_id&quot;: %s}" class="home">' % self.page.pk
+        self.assertIn(expected + '<div id="wpr-body"><p>lorem ipsum</p></div>', content)
+        self.assertRegex(content, re.compile('<div id="df-sidebar">.*</body></html>$', re.DOTALL))
+
+    def test_no_body(self):
+        """
+        Content without a body is not modified
+        """
+        request = RequestFactory().get(self.page.get_absolute_url())
+        request.user = self.staff
+        request.session = {}
+        content = '<html><head></head></html>'
+        response = middleware.process_response(request, HttpResponse(content))
+        self.assertEqual(force_str(response.content), content)
+
+
+class TestHtmlInjector(SimpleTestCase):
+    def inject(self, chunks):
+        injector = HtmlInjector(b'<head-html>', b' attrs', b'<body-start>', b'<body-end>')
+        return b''.join(injector.stream(chunks))
+
+    def test_inject(self):
+        content = b'<html><head></head>\n<body class="x"><p>body</p></body></html>'
+        expected = b'<html><head><head-html></head>\n<body attrs class="x"><body-start><p>body</p><body-end></body></html>'
+        self.assertEqual(HtmlInjector(b'<head-html>', b' attrs', b'<body-start>', b'<body-end>').inject(content), expected)
+        # Every way of splitting the content gives the same result
+        for i in range(len(content)):
+            self.assertEqual(self.inject([content[:i], content[i:]]), expected)
+        self.assertEqual(self.inject([content[i:i + 1] for i in range(len(content))]), expected)
+
+    def test_last_body_end(self):
+        """
+        The body html is injected before the last `</body>`
+        """
+        content = [b'<head></head><body><script>"</body>"</script>', b'</body>', b'</html>']
+        self.assertEqual(
+            self.inject(content),
+            b'<head><head-html></head><body attrs><body-start><script>"</body>"</script><body-end></body></html>')
+
+    def test_incomplete(self):
+        """
+        Content without the tags is not modified, unless it is streamed and only lacks `</body>`
+        """
+        for content in [b'', b'<p>text</p>', b'<head></head><p>text</p>', b'<head></head><body><p>text</p>']:
+            self.assertEqual(HtmlInjector(b'<head-html>', b' attrs', b'<body-start>', b'<body-end>').inject(content),
+                             content)
+        # - streamed content without a body
+        for content in [b'', b'<p>text</p>', b'<head></head><p>text</p>', b'<head><title>a</title></head><body']:
+            self.assertEqual(self.inject([content[i:i + 1] for i in range(len(content))]), content)
+            self.assertEqual(self.inject([content]), content)
+        # - streamed content without `</body>`: the html that was sent is completed at the end
+        content = b'<head></head><body><p>text</p>'
+        expected = b'<head><head-html></head><body attrs><body-start><p>text</p><body-end>'
+        self.assertEqual(self.inject([content]), expected)
+        self.assertEqual(self.inject([content[i:i + 1] for i in range(len(content))]), expected)
+
+
+class TestFiberPageMiddleware(TestCase):
+    def setUp(self):
+        self.page = Page.objects.create(title='home', url='/')
+
+    def test_fiber_page(self):
+        request = RequestFactory().get('/')
+        self.assertNumQueries(0, lambda: FiberPageMiddleware(lambda: None).process_request(request))
+        self.assertEqual(request.fiber_page.pk, self.page.pk)
+        self.assertEqual(Page.objects.get_for_request(request), self.page)
+
+    def test_no_fiber_page(self):
+        request = RequestFactory().get('/empty/')
+        FiberPageMiddleware(lambda: None).process_request(request)
+        self.assertFalse(request.fiber_page)
+
 
 class TestResponseNotModified(TestCase):
     def test_get_frontend_url(self):
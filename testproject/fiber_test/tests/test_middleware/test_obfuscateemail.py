@@ -1,6 +1,7 @@
 import os
 
 import html
+import random
 
 from unittest import skipUnless
 
@@ -8,6 +9,9 @@ from django.http import HttpResponse, StreamingHttpResponse
 from django.test import SimpleTestCase
 from django.utils.encoding import force_str
 
+import fiber.middleware
+
+from fiber.cache import LRUCache
 from fiber.middleware import ObfuscateEmailAddressMiddleware
 
 
@@ -32,6 +36,27 @@ class TestEmailAddressObfuscation(SimpleTestCase):
             content)
 
 
+class TestDeterministicObfuscation(SimpleTestCase):
+    """Test the obfuscation with FIBER_OBFUSCATED_EMAIL_CACHE_SIZE"""
+
+    def setUp(self):
+        self.middleware = ObfuscateEmailAddressMiddleware(lambda: None)
+        self._encoded_emails = fiber.middleware.encoded_emails
+        fiber.middleware.encoded_emails = LRUCache(10)
+
+    def tearDown(self):
+        fiber.middleware.encoded_emails = self._encoded_emails
+
+    def test_same_encoding(self):
+        """An address is always encoded the same way, also by other processes"""
+        encoded = self.middleware.encode_email('example@example.com')
+        self.assertEqual(self.middleware.encode_email('example@example.com'), encoded)
+        self.assertEqual(fiber.middleware.encoded_emails.hits, 1)
+        self.assertEqual(fiber.middleware.encode_email('example@example.com', random.Random('example@example.com')),
+                         encoded)
+        self.assertEqual(html.unescape(encoded), 'example@example.com')
+
+
 class TestEmailAddressReplacement(SimpleTestCase):
     """Test if email addresses get detected, and replaced, correctly"""
 
@@ -102,6 +127,20 @@ class TestEmailAddressReplacement(SimpleTestCase):
         expected = 'Email Me !!email@example.com!!.'
         self.assertResponse(content, expected)
 
+    @skipUnless(StreamingHttpResponse, 'StreamingHttpResponse is not available')
+    def test_streaming(self):
+        """Email addresses that are split over chunks are replaced"""
+        content = ['Contact me at: sp', 'am@exam', 'ple.com or ', 'me@', 'example', '.com', '\n', 'my-friend@example.com']
+        expected = 'Contact me at: !!spam@example.com!! or !!me@example.com!!\n!!my-friend@example.com!!'
+        response = self.middleware.process_response(None, StreamingHttpResponse(content))
+        self.assertEqual(force_str(b''.join(response.streaming_content)), expected)
+
+    def test_non_ascii(self):
+        content = 'Caf\xe9 m\xfcller@example.com'
+        self.assertResponse(content, 'Caf\xe9 !!m\xfcller@example.com!!')
+        response = self.middleware.process_response(None, StreamingHttpResponse([c.encode() for c in content]))
+        self.assertEqual(force_str(b''.join(response.streaming_content)), 'Caf\xe9 !!m\xfcller@example.com!!')
+
     def test_replacement_in_very_large_page(self):
         with open(os.path.join(os.path.dirname(__file__), 'very_large_page.html')) as f:
             content = f.read()
@@ -122,11 +161,10 @@ class TestNonReplacement(SimpleTestCase):
         self.assertEqual(
             force_str(self.middleware.process_response(None, response).content), content)
 
-    @skipUnless(StreamingHttpResponse, 'StreamingHttpResponse is not available')
-    def test_skips_streaming(self):
-        content = 'Contact me at: spam@example.com'
-        response = StreamingHttpResponse(content)
-        self.assertEqual(''.join(force_str(s) for s in self.middleware.process_response(None, response)), content)
+    def test_no_email_addresses(self):
+        """Content without @ is not decoded"""
+        response = HttpResponse(b'\xff not utf-8')
+        self.assertEqual(self.middleware.process_response(None, response).content, b'\xff not utf-8')
 
     def test_twitter_username(self):
         content = 'On twitter I am known as @example'
@@ -2,6 +2,8 @@ from django.core.exceptions import ImproperlyConfigured
 from django.views.generic import View
 from django.test import TestCase, SimpleTestCase
 
+import fiber.mixins
+
 from fiber.mixins import FiberPageMixin
 from fiber.models import Page
 
@@ -106,6 +108,54 @@ class TestGetCurrentPagesWithMarkCurrentRegexes(TestCase):
         self.assertEqual([self.about, self.contact, self.news, archive], view.get_fiber_current_pages())
 
 
+class TestGetCurrentPagesFromSnapshot(TestGetCurrentPagesWithMarkCurrentRegexes):
+    """Same as TestGetCurrentPagesWithMarkCurrentRegexes, using the in-memory page tree snapshot"""
+    def setUp(self):
+        super().setUp()
+        self._local_cache = fiber.mixins.LOCAL_CACHE
+        fiber.mixins.LOCAL_CACHE = True
+
+    def tearDown(self):
+        fiber.mixins.LOCAL_CACHE = self._local_cache
+
+    def test_no_queries(self):
+        """Doesn't query the database once the snapshot is built"""
+        Page.objects.get_tree_snapshot()
+        view = TestView()
+        view.fiber_page_url = '/news/'
+        view.fiber_page = self.news
+        with self.assertNumQueries(0):
+            self.assertEqual([self.about, self.contact, self.news], view.get_fiber_current_pages())
+
+    def test_regexes_changed(self):
+        """Changes to mark_current_regexes are picked up"""
+        self.news.mark_current_regexes = ''
+        self.news.save()
+        view = TestView()
+        view.fiber_page_url = '/'
+        self.assertEqual([], view.get_fiber_current_pages())
+
+    def test_regexes_with_groups(self):
+        """Regexes with backreferences are matched separately"""
+        Page.objects.create(title='repeat', parent=self.root, url='/repeat/', mark_current_regexes=r'^/(\w+)/\1/$')
+        view = TestView()
+        view.fiber_page_url = '/abc/abc/'
+        self.assertEqual(['repeat'], [page.title for page in view.get_fiber_current_pages()])
+
+    def test_regexes_with_inline_flags(self):
+        """Inline flags only apply to their own regex"""
+        Page.objects.create(
+            title='mixed', parent=self.root, url='/mixed/', mark_current_regexes='^/lower/$\n(?i)^/any-case/$')
+        view = TestView()
+        view.fiber_page_url = '/ANY-CASE/'
+        self.assertEqual(['mixed'], [page.title for page in view.get_fiber_current_pages()])
+        view = TestView()
+        view.fiber_page_url = '/LOWER/'
+        self.assertEqual([], view.get_fiber_current_pages())
+        view = TestView()
+        view.fiber_page_url = '/ABOUT/'
+        self.assertEqual([], view.get_fiber_current_pages())
+
 class TestGetContextData(TestCase):
     """Test get_context_data, super object does NOT implement get_context_data"""
     view_class = TestContext
@@ -1,13 +1,26 @@
 import json
 
-from django.test import TestCase
-from django.urls import reverse
+from django.conf.urls.i18n import i18n_patterns
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import path, reverse
+from django.utils import translation
 from django.utils.encoding import force_str
+from django.views.generic import View
 
-from fiber.models import Page, ContentItem, PageContentItem
+import fiber.managers
+
+from fiber.cache import LRUCache
+from fiber.managers import PageManager
+from fiber.models import Page, ContentItem, ContentItemLink, PageContentItem
 from ..test_util import format_list, condense_html_whitespace
 
 
+urlpatterns = i18n_patterns(
+    path('shop/', View.as_view(), name='shop'),
+)
+
+
 class ContentItemTest(TestCase):
     def generate_data(self):
         """
@@ -55,6 +68,24 @@ class ContentItemTest(TestCase):
             'a b c'
         )
 
+    def test_get_content_group_counts(self):
+        self.generate_data()
+
+        with self.assertNumQueries(1):
+            counts = ContentItem.objects.get_content_group_counts()
+        self.assertEqual(
+            [(group['id'], group['count']) for group in counts],
+            [('multiple', 1), ('unused', 1), ('once', 1), ('recently_changed', 3)])
+        self.assertTrue(all(group['load_on_demand'] for group in counts))
+
+    def test_get_content_group(self):
+        self.generate_data()
+
+        self.assertEqual([c.name for c in ContentItem.objects.get_content_group('multiple')], ['a'])
+        self.assertEqual([c.name for c in ContentItem.objects.get_content_group('recently_changed')], ['a', 'b', 'c'])
+        with self.assertRaises(KeyError):
+            ContentItem.objects.get_content_group('missing')
+
     def test_rename_url(self):
         def check_content(name, html):
             self.assertEqual(
@@ -87,6 +118,25 @@ class ContentItemTest(TestCase):
         check_content('a', '<p>p</p><p><a href="/main/">1</a></p>')
         check_content('b', '<p><a href="/main/abc/">abc</a></p>')
         check_content('c', '<p><a href="/section2/">2</a></p>')
+        self.assertEqual(
+            sorted(ContentItemLink.objects.values_list('url', flat=True)), ['/main/', '/main/abc/', '/section2/'])
+
+    def test_rename_url_selects_linking_content_items(self):
+        ContentItem.objects.create(name='a', content_html='<p><a href="/section1/">1</a></p>')
+        ContentItem.objects.create(name='b', content_html='<p>/section1/</p>')
+        with self.assertNumQueries(5):
+            # retrieve, update, and update the links (retrieve, delete, create)
+            ContentItem.objects.rename_url('/section1/', '/main/')
+        self.assertEqual(ContentItem.objects.get(name='b').content_html, '<p>/section1/</p>')
+
+    def test_links(self):
+        content_item = ContentItem.objects.create(
+            content_html='<a href="/a/">a</a> <a href=\'/b/\'>b</a> <a href="/a/">a</a>')
+        self.assertEqual(sorted(content_item.links.values_list('url', flat=True)), ['/a/', '/b/'])
+
+        content_item.content_html = '<a href="/c/">c</a> <a href="/b/">b</a>'
+        content_item.save()
+        self.assertEqual(sorted(content_item.links.values_list('url', flat=True)), ['/b/', '/c/'])
 
 
 class PageTest(TestCase):
@@ -165,6 +215,95 @@ class PageTest(TestCase):
         self.assertEqual(page_xyz.get_previous_sibling().title, 'def')
         self.assertEqual(page_xyz.get_next_sibling().title, 'ghi')
 
+    def test_move_page_queries(self):
+        """Moving a page propagates the change of its url once"""
+        self.generate_data()
+        ContentItem.objects.create(name='a', content_html='<p><a href="/section1/abc/xyz/">xyz</a></p>')
+        page_abc = Page.objects.get(title='abc')
+        section2_id = Page.objects.get(title='section2').id
+
+        # - the target, the move itself and the save of the page; one pass for the descendants, the links in content
+        #   items and their `used_on_pages_data`
+        with self.assertNumQueries(13):
+            page_abc.move_page(section2_id, 'inside')
+        self.assertEqual(Page.objects.get(title='xyz').absolute_url, '/section2/abc/xyz/')
+
+    def test_url_change_in_subtree(self):
+        """Changing the url of a page changes the urls of its descendants in content items and used_on_pages_data"""
+        self.generate_data()
+        content_item_links = ContentItem.objects.create(
+            name='links',
+            content_html='<a href="/section1/">1</a><a href="/section1/abc/xyz/">xyz</a><a href="/section1x/">x</a>')
+        content_item_xyz = ContentItem.objects.create(name='xyz', content_html='<p>xyz</p>')
+        PageContentItem.objects.create(page=Page.objects.get(title='xyz'), content_item=content_item_xyz)
+
+        page_section1 = Page.objects.get(title='section1')
+        page_section1.url = 'main'
+        page_section1.save()
+
+        self.assertEqual(
+            ContentItem.objects.get(id=content_item_links.id).content_html,
+            '<a href="/main/">1</a><a href="/main/abc/xyz/">xyz</a><a href="/section1x/">x</a>')
+        self.assertEqual(
+            ContentItem.objects.get(id=content_item_xyz.id).used_on_pages_data,
+            [dict(url='/main/abc/xyz/', title='xyz')])
+
+    def test_create_jqtree_data(self):
+        self.generate_data()
+        staff = User.objects.create_user('staff', 'staff@example.com', password='staff')
+        staff.is_staff = True
+        staff.save()
+
+        with self.assertNumQueries(1):
+            data = Page.objects.create_jqtree_data(staff)
+        self.assertEqual([node['label'] for node in data], ['home', 'example'])
+        section1 = data[0]['children'][0]
+        self.assertEqual(section1['label'], 'section1')
+        self.assertEqual(section1['change_url'], Page.objects.get(title='section1').get_change_url())
+        self.assertEqual(section1['add_url'], Page.get_add_url())
+        self.assertEqual(section1['children'][0]['children'][0]['url'], '/section1/abc/xyz/')
+
+    def test_create_jqtree_data_inconsistent_tree(self):
+        """Pages that come before their parent in an inconsistent tree are skipped"""
+        self.generate_data()
+        staff = User.objects.create_user('staff', 'staff@example.com', password='staff')
+        staff.is_staff = True
+        staff.save()
+        # e.g. pages that were imported without rebuilding the tree
+        Page.objects.filter(title='abc').update(lft=0)
+
+        data = Page.objects.create_jqtree_data(staff)
+        self.assertEqual([node['label'] for node in data[0]['children'][0].get('children', [])], [])
+
+    def test_create_jqtree_level_data(self):
+        self.generate_data()
+        staff = User.objects.create_user('staff', 'staff@example.com', password='staff')
+        staff.is_staff = True
+        staff.save()
+
+        roots = Page.objects.create_jqtree_level_data(staff)
+        self.assertEqual([node['label'] for node in roots], ['home', 'example'])
+        self.assertTrue(roots[0]['load_on_demand'])
+        self.assertNotIn('load_on_demand', roots[1])
+        self.assertNotIn('children', roots[0])
+
+        section1 = Page.objects.get(title='section1')
+        with self.assertNumQueries(1):
+            children = Page.objects.create_jqtree_level_data(staff, section1.id)
+        self.assertEqual([node['label'] for node in children], ['abc'])
+        self.assertEqual(children[0]['url'], '/section1/abc/')
+        self.assertTrue(children[0]['editable'])
+
+    def test_search(self):
+        self.generate_data()
+        self.assertEqual([page.title for page in Page.objects.search('ABC')], ['abc', 'xyz'])
+        self.assertEqual(list(Page.objects.search('')), [])
+
+        data = Page.objects.create_jqtree_search_data(AnonymousUser(), Page.objects.search('xyz'))
+        self.assertEqual(
+            data[0]['ancestor_ids'],
+            [Page.objects.get(title=title).id for title in ('home', 'section1', 'abc')])
+
     def test_get_absolute_url(self):
         def test_url(title, url):
             self.assertEqual(
@@ -216,6 +355,31 @@ class PageTest(TestCase):
             '<p><a href="/section1/a_b_c/xyz/">xyz</a></p>'
         )
 
+    def test_stored_absolute_url(self):
+        def test_url(title, url):
+            self.assertEqual(Page.objects.get(title=title).absolute_url, url)
+
+        # generate data
+        self.generate_data()
+
+        test_url('home', '')
+        test_url('section1', '/section1/')
+        test_url('xyz', '/section1/abc/xyz/')
+        test_url('def', '/def/')
+        test_url('example', 'http://example.com')
+
+        # - change url; descendants are updated
+        page_abc = Page.objects.get(title='abc')
+        page_abc.url = 'a_b_c'
+        page_abc.save()
+        test_url('abc', '/section1/a_b_c/')
+        test_url('xyz', '/section1/a_b_c/xyz/')
+
+        # - move; descendants are updated
+        Page.objects.get(title='abc').move_page(Page.objects.get(title='section2').id, 'inside')
+        test_url('abc', '/section2/a_b_c/')
+        test_url('xyz', '/section2/a_b_c/xyz/')
+
     def test_unicode(self):
         self.assertEqual(force_str(Page(title='abc')), 'abc')
 
@@ -257,6 +421,186 @@ class PageTest(TestCase):
         self.assertNumQueries(0, lambda: page_def.get_ancestors())
 
 
+class PageUrlIndexTest(TestCase):
+    def setUp(self):
+        self._local_cache = fiber.managers.LOCAL_CACHE
+        fiber.managers.LOCAL_CACHE = True
+
+        self.home = Page.objects.create(title='home')
+        self.section = Page.objects.create(title='section', parent=self.home, url='section')
+        self.abc = Page.objects.create(title='abc', parent=self.section, url='abc')
+        self.absolute = Page.objects.create(title='absolute', parent=self.section, url='/absolute/')
+        self.named = Page.objects.create(title='named', parent=self.home, url='"fiber_login"')
+
+    def tearDown(self):
+        fiber.managers.LOCAL_CACHE = self._local_cache
+
+    def test_get_by_url(self):
+        self.assertEqual(Page.objects.get_by_url('/section/'), self.section)
+        self.assertEqual(Page.objects.get_by_url('/section/abc/'), self.abc)
+        self.assertEqual(Page.objects.get_by_url('/absolute/'), self.absolute)
+        self.assertEqual(Page.objects.get_by_url(reverse('fiber_login')), self.named)
+        self.assertIsNone(Page.objects.get_by_url('/does-not-exist/'))
+
+    def test_get_by_url_queries(self):
+        Page.objects.get_url_index()
+        Page.objects.get_named_url_index()
+
+        # - one query for the page and its ancestors
+        with self.assertNumQueries(1):
+            page = Page.objects.get_by_url('/section/abc/')
+        self.assertNumQueries(0, lambda: page.get_ancestors())
+        self.assertEqual(format_list(page.get_ancestors()), 'home section')
+
+        # - unknown urls don't need a query
+        self.assertNumQueries(0, lambda: Page.objects.get_by_url('/does-not-exist/'))
+
+    def test_index_is_rebuilt_on_changes(self):
+        self.assertIsNone(Page.objects.get_by_url('/section/xyz/'))
+
+        # - create
+        xyz = Page.objects.create(title='xyz', parent=self.section, url='xyz')
+        self.assertEqual(Page.objects.get_by_url('/section/xyz/'), xyz)
+
+        # - move
+        xyz.move_to(self.abc)
+        self.assertIsNone(Page.objects.get_by_url('/section/xyz/'))
+        self.assertEqual(Page.objects.get_by_url('/section/abc/xyz/'), xyz)
+
+        # - delete
+        Page.objects.get(id=xyz.id).delete()
+        self.assertIsNone(Page.objects.get_by_url('/section/abc/xyz/'))
+
+
+class PageRedirectMapTest(TestCase):
+    def setUp(self):
+        self._local_cache = fiber.managers.LOCAL_CACHE
+        fiber.managers.LOCAL_CACHE = True
+
+        self.home = Page.objects.create(title='home')
+        self.section = Page.objects.create(title='section', parent=self.home, url='section')
+        self.old = Page.objects.create(title='old', parent=self.home, url='/old/', redirect_page=self.section)
+
+    def tearDown(self):
+        fiber.managers.LOCAL_CACHE = self._local_cache
+
+    def test_get_redirect_url(self):
+        self.assertEqual(Page.objects.get_redirect_url('/old/'), '/section/')
+        self.assertIsNone(Page.objects.get_redirect_url('/section/'))
+        self.assertIsNone(Page.objects.get_redirect_url('/does-not-exist/'))
+        self.assertNumQueries(0, lambda: Page.objects.get_redirect_url('/old/'))
+
+    def test_skips_private_pages_and_self_redirects(self):
+        self.old.is_public = False
+        self.old.save()
+        self.section.redirect_page = self.section
+        self.section.save()
+        self.assertEqual(Page.objects.get_redirect_map(), {})
+
+    def test_map_is_rebuilt_on_changes(self):
+        new = Page.objects.create(title='new', parent=self.home, url='new')
+        self.old.redirect_page = new
+        self.old.save()
+        self.assertEqual(Page.objects.get_redirect_url('/old/'), '/new/')
+
+        new.move_to(self.section)
+        self.assertEqual(Page.objects.get_redirect_url('/old/'), '/section/new/')
+
+    def test_requires_local_cache(self):
+        fiber.managers.LOCAL_CACHE = False
+        self.assertIsNone(Page.objects.get_redirect_url('/old/'))
+
+
+@override_settings(ROOT_URLCONF=__name__, LANGUAGES=[('en', 'English'), ('nl', 'Dutch')])
+class PageNamedUrlTest(TestCase):
+    def setUp(self):
+        self._local_cache = fiber.managers.LOCAL_CACHE
+
+        self.home = Page.objects.create(title='home')
+        self.shop = Page.objects.create(title='shop', parent=self.home, url='"shop"')
+        self.products = Page.objects.create(title='products', parent=self.shop, url='products')
+        self.old = Page.objects.create(title='old', parent=self.home, url='/old/', redirect_page=self.shop)
+
+    def tearDown(self):
+        fiber.managers.LOCAL_CACHE = self._local_cache
+
+    def test_absolute_url_is_not_stored(self):
+        self.assertEqual(Page.objects.get(id=self.shop.id).absolute_url, '')
+        self.assertEqual(Page.objects.get(id=self.products.id).absolute_url, '')
+
+    def test_get_by_url(self):
+        for local_cache in [False, True]:
+            fiber.managers.LOCAL_CACHE = local_cache
+            with translation.override('nl'):
+                self.assertEqual(Page.objects.get_by_url('/nl/shop/'), self.shop)
+                self.assertEqual(Page.objects.get_by_url('/nl/shop/products/'), self.products)
+                self.assertIsNone(Page.objects.get_by_url('/en/shop/'))
+            with translation.override('en'):
+                self.assertEqual(Page.objects.get_by_url('/en/shop/'), self.shop)
+                self.assertIsNone(Page.objects.get_by_url('/nl/shop/'))
+
+    def test_get_redirect_url(self):
+        fiber.managers.LOCAL_CACHE = True
+        with translation.override('nl'):
+            self.assertEqual(Page.objects.get_redirect_url('/old/'), '/nl/shop/')
+        with translation.override('en'):
+            self.assertEqual(Page.objects.get_redirect_url('/old/'), '/en/shop/')
+
+
+class PageMissingUrlCacheTest(TestCase):
+    def setUp(self):
+        self._missing_urls = PageManager.missing_urls
+        PageManager.missing_urls = LRUCache(2)
+
+        self.home = Page.objects.create(title='home')
+
+    def tearDown(self):
+        PageManager.missing_urls = self._missing_urls
+
+    def test_missing_url(self):
+        # - first lookup queries the database
+        self.assertIsNone(Page.objects.get_by_url('/missing/'))
+        self.assertEqual(PageManager.missing_urls.misses, 1)
+
+        # - repeated lookups don't
+        self.assertNumQueries(0, lambda: Page.objects.get_by_url('/missing/'))
+        self.assertEqual(PageManager.missing_urls.hits, 1)
+
+    def test_flushed_on_page_changes(self):
+        self.assertIsNone(Page.objects.get_by_url('/missing/'))
+
+        page = Page.objects.create(title='missing', parent=self.home, url='missing')
+        self.assertEqual(Page.objects.get_by_url('/missing/'), page)
+
+    def test_size(self):
+        for url in ['/a/', '/b/', '/c/']:
+            Page.objects.get_by_url(url)
+        self.assertEqual(len(PageManager.missing_urls), 2)
+
+
+class PageForRequestTest(TestCase):
+    def setUp(self):
+        self.home = Page.objects.create(title='home', url='/')
+
+    def test_get_for_request(self):
+        request = RequestFactory().get('/')
+        self.assertEqual(Page.objects.get_for_request(request), self.home)
+        with self.assertNumQueries(0):
+            self.assertEqual(Page.objects.get_for_request(request), self.home)
+
+    def test_not_found(self):
+        """The absence of a page is remembered as well"""
+        request = RequestFactory().get('/missing/')
+        self.assertNumQueries(1, lambda: Page.objects.get_for_request(request))
+        with self.assertNumQueries(0):
+            self.assertIsNone(Page.objects.get_for_request(request))
+
+    def test_url(self):
+        request = RequestFactory().get('/missing/')
+        self.assertEqual(Page.objects.get_for_request(request, '/'), self.home)
+        self.assertIsNone(Page.objects.get_for_request(request))
+
+
 class PageContentItemTest(TestCase):
     def test_move(self):
         def get_content(page_id, block_name='main'):
@@ -305,6 +649,14 @@ class PageContentItemTest(TestCase):
         self.assertEqual('b', get_content(page.id, 'main'))
         self.assertEqual('c a', get_content(page.id, 'side'))
 
+        # 7. the number of queries doesn't depend on the number of content items in the block
+        for i in range(10):
+            content_item = ContentItem.objects.create(name=str(i))
+            PageContentItem.objects.create(page=page, content_item=content_item, block_name='side', sort=i + 2)
+        with self.assertNumQueries(2):
+            item_c.move()
+        self.assertEqual('a 0 1 2 3 4 5 6 7 8 9 c', get_content(page.id, 'side'))
+
 
 class TestContentItem(TestCase):
     def test_unicode(self):
@@ -321,6 +673,18 @@ class TestContentItem(TestCase):
         self.assertEqual(force_str(ContentItem(content_html='abcdefghij' * 6)),
                          'abcdefghijabcdefghijabcdefghijabcdefghijabcdefghij...')
 
+    def test_summary(self):
+        content_item = ContentItem.objects.create(content_html='<p>abc &amp;\n <b>def</b></p>')
+        self.assertEqual(content_item.summary, 'abc & def')
+
+        content_item = ContentItem.objects.get(id=content_item.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(force_str(content_item), 'abc & def')
+
+        content_item.content_html = 'xyz'
+        content_item.save(update_fields=['content_html'])
+        self.assertEqual(ContentItem.objects.get(id=content_item.id).summary, 'xyz')
+
     def test_get_add_url(self):
         self.assertEqual(
             ContentItem.get_add_url(),
@@ -352,3 +716,19 @@ class TestContentItem(TestCase):
         # - load contentitem
         content_item1 = ContentItem.objects.get(id=content_item1.id)
         self.assertEqual(content_item1.used_on_pages_data, [dict(url='/abc/', title='p1')])
+
+    def test_used_on_pages_queries(self):
+        """Updating used_on_pages_data takes one query to read the pages and one to write, and keeps `updated`"""
+        page1 = Page.objects.create(title='p1', url='/abc/')
+        page2 = Page.objects.create(title='p2', url='def', parent=page1)
+        content_item1 = ContentItem.objects.create()
+        updated = content_item1.updated
+        PageContentItem.objects.create(page=page1, content_item=content_item1)
+        PageContentItem.objects.create(page=page2, content_item=content_item1)
+
+        with self.assertNumQueries(2):
+            content_item1.set_used_on_pages_json()
+        content_item1 = ContentItem.objects.get(id=content_item1.id)
+        self.assertEqual(
+            content_item1.used_on_pages_data, [dict(url='/abc/', title='p1'), dict(url='/abc/def/', title='p2')])
+        self.assertEqual(content_item1.updated, updated)
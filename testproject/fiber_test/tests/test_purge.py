@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+
+from django.test import TestCase
+
+import fiber.purge
+
+from fiber.models import Page, ContentItem, PageContentItem
+from fiber.purge import UrlBatch, urls_changed
+
+
+class TestPurgeUrls(TestCase):
+    def setUp(self):
+        self.home = Page.objects.create(title='home', url='/')
+        self.section = Page.objects.create(title='section', url='section', parent=self.home)
+        self.sub = Page.objects.create(title='sub', url='sub', parent=self.section)
+        self.other_section = Page.objects.create(title='other section', url='other', parent=self.home)
+        self.other_sub = Page.objects.create(title='other sub', url='other-sub', parent=self.other_section)
+        self.general = Page.objects.create(title='general')
+        self.contact = Page.objects.create(title='contact', url='/contact/', parent=self.general)
+        self.content_item = ContentItem.objects.create(content_html='<p>sub</p>')
+        PageContentItem.objects.create(page=self.sub, content_item=self.content_item, block_name='main')
+
+        self.sent = []
+        urls_changed.connect(self.receive)
+
+    def tearDown(self):
+        urls_changed.disconnect(self.receive)
+
+    def receive(self, sender, urls, **kwargs):
+        self.sent.append(urls)
+
+    def test_content_item(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.content_item.content_html = '<p>changed</p>'
+            self.content_item.save()
+        self.assertEqual(self.sent, [['/section/sub/']])
+
+    def test_page_content_item(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            PageContentItem.objects.create(page=self.other_sub, content_item=self.content_item, block_name='main')
+        self.assertEqual(self.sent, [['/other/other-sub/']])
+
+    def test_page(self):
+        """The page, its descendants and the pages whose menus include it"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub.doc_title = 'changed'
+            self.sub.save()
+        self.assertEqual(self.sent, [['/section/', '/section/sub/']])
+
+    def test_page_in_menus(self):
+        """Changing what menus show covers all pages"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub.title = 'changed'
+            self.sub.save()
+        self.assertEqual(self.sent, [['/', '/contact/', '/other/', '/other/other-sub/', '/section/', '/section/sub/']])
+
+    def test_level_1_page(self):
+        """Pages at level 1 are shown in menus on all pages"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.section.doc_title = 'changed'
+            self.section.save()
+        self.assertEqual(self.sent, [['/', '/contact/', '/other/', '/other/other-sub/', '/section/', '/section/sub/']])
+
+    def test_move(self):
+        """Moving a page covers the old and the new urls"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.get(id=self.sub.id).move_page(self.other_section.id, 'inside')
+        self.assertEqual(self.sent, [[
+            '/', '/contact/', '/other/', '/other/other-sub/', '/other/sub/', '/section/', '/section/sub/']])
+
+    def test_url_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.section.url = 'renamed'
+            self.section.save()
+        self.assertEqual(self.sent, [[
+            '/', '/contact/', '/other/', '/other/other-sub/', '/renamed/', '/renamed/sub/', '/section/',
+            '/section/sub/']])
+
+    def test_create_page(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.create(title='new', url='new', parent=self.other_section)
+        self.assertEqual(self.sent, [['/other/', '/other/new/', '/other/other-sub/']])
+
+    def test_delete_page(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_sub.delete()
+        self.assertEqual(self.sent, [['/', '/contact/', '/other/', '/other/other-sub/', '/section/', '/section/sub/']])
+
+    def test_affected_urls(self):
+        """Pages without a url aren't included"""
+        self.assertEqual(Page.objects.get_affected_urls([self.contact.id]), {
+            '/', '/contact/', '/other/', '/other/other-sub/', '/section/', '/section/sub/'})
+        self.assertEqual(Page.objects.get_affected_urls([self.general.id]), {'/contact/'})
+
+    def test_batched(self):
+        """All urls of a transaction are sent at once, without duplicates"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.content_item.save()
+            self.content_item.save()
+            PageContentItem.objects.create(page=self.other_sub, content_item=self.content_item, block_name='main')
+        self.assertEqual(self.sent, [['/other/other-sub/', '/section/sub/']])
+
+    def test_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.content_item.delete()
+        self.assertEqual(self.sent, [['/section/sub/']])
+
+
+class TestJsonLinesSink(TestCase):
+    def setUp(self):
+        self._purge_sinks = fiber.purge.PURGE_SINKS
+        self._purge_file = fiber.purge.PURGE_FILE
+        fd, fiber.purge.PURGE_FILE = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        fiber.purge.PURGE_SINKS = ['fiber.purge.write_json_lines']
+
+    def tearDown(self):
+        os.remove(fiber.purge.PURGE_FILE)
+        fiber.purge.PURGE_SINKS = self._purge_sinks
+        fiber.purge.PURGE_FILE = self._purge_file
+
+    def test_write_json_lines(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.create(title='home', url='/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.create(title='about', url='/about/')
+        with open(fiber.purge.PURGE_FILE) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line['urls'] for line in lines], [['/'], ['/about/']])
+
+
+class TestDisabled(TestCase):
+    def test_disabled(self):
+        """Without receivers and sinks, no urls are collected"""
+        page = Page.objects.create(title='home', url='/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            page.save()
+        self.assertFalse([callback for callback in callbacks if isinstance(callback, UrlBatch)])
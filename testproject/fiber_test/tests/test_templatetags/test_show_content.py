@@ -1,4 +1,5 @@
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
 from django.urls import reverse
 
@@ -50,6 +51,23 @@ class TestShowContent(RenderMixin, TestCase):
     def test_show_content_that_does_not_exist(self):
         self.assertRendered('{% load fiber_tags %}{% show_content "missing" %}', '')
 
+    def test_show_content_queries(self):
+        """The content items of all show_content tags in a template are retrieved in one query"""
+        ContentItem.objects.create(name='footer', content_html='<p>footer</p>')
+        with self.assertNumQueries(1):
+            self.assertRendered(
+                '{% load fiber_tags %}{% show_content "contact" %}{% show_content "missing" %}{% show_content "footer" %}',
+                '''
+                <div class="content"><p><a href="mailto:email@example.com">Contact me<a></p></div>
+                <div class="content"><p>footer</p></div>''')
+
+    def test_show_content_variable(self):
+        ContentItem.objects.create(name='footer', content_html='<p>footer</p>')
+        self.assertRendered(
+            '{% load fiber_tags %}{% for name in names %}{% show_content name %}{% endfor %}',
+            '<div class="content"><p>footer</p></div><div class="content"><p><a href="mailto:email@example.com">Contact me<a></p></div>',
+            {'names': ['footer', 'contact']})
+
 
 class TestAutoCreate(RenderMixin, TestCase):
     def setUp(self):
@@ -68,6 +86,15 @@ class TestAutoCreate(RenderMixin, TestCase):
         self.assertRendered('{% load fiber_tags %}{% show_content "missing" %}', '<div class="content"></div>')
         self.assertEqual(ContentItem.objects.all().count(), 1)
 
+    def test_auto_create_batched(self):
+        # Databases that don't return the primary keys of bulk inserts (e.g. SQLite before Django 4.0) need a query
+        # to retrieve the created content items
+        with self.assertNumQueries(2 if connection.features.can_return_rows_from_bulk_insert else 3):
+            self.assertRendered(
+                '{% load fiber_tags %}{% show_content "header" %}{% show_content "footer" %}',
+                '<div class="content"></div><div class="content"></div>')
+        self.assertEqual(sorted(ContentItem.objects.values_list('name', flat=True)), ['footer', 'header'])
+
     def test_auto_create_staff(self):
         self.assertRendered(
             '{% load fiber_tags %}{% show_content "missing" %}',
@@ -76,3 +103,39 @@ class TestAutoCreate(RenderMixin, TestCase):
                 'item_pk': 1,
                 'edit_url_item': reverse('fiber_admin:fiber_contentitem_change', args=[1])
             }, {'user': self.staff})
+
+
+class TestContentItemCache(RenderMixin, TestCase):
+    def setUp(self):
+        self._content_item_cache = fiber.templatetags.fiber_tags.CONTENT_ITEM_CACHE
+        fiber.templatetags.fiber_tags.CONTENT_ITEM_CACHE = True
+        self.item = ContentItem.objects.create(
+            name='banner', content_html='banner', template_name='content_item_template.html')
+
+    def tearDown(self):
+        fiber.templatetags.fiber_tags.CONTENT_ITEM_CACHE = self._content_item_cache
+
+    def test_cached(self):
+        """The output of content items with a template is cached"""
+        self.assertRendered(
+            '{% load fiber_tags %}{% show_content "banner" %}', '<div class="content"><p>banner one</p></div>',
+            {'extra': 'one'})
+        self.assertRendered(
+            '{% load fiber_tags %}{% show_content "banner" %}', '<div class="content"><p>banner one</p></div>',
+            {'extra': 'two'})
+
+    def test_invalidated_on_save(self):
+        self.assertRendered(
+            '{% load fiber_tags %}{% show_content "banner" %}', '<div class="content"><p>banner one</p></div>',
+            {'extra': 'one'})
+        self.item.content_html = 'changed'
+        self.item.save()
+        self.assertRendered(
+            '{% load fiber_tags %}{% show_content "banner" %}', '<div class="content"><p>changed two</p></div>',
+            {'extra': 'two'})
+
+    def test_without_template(self):
+        """Content items without a template are not cached"""
+        ContentItem.objects.create(name='plain', content_html='<p>plain</p>')
+        self.assertRendered(
+            '{% load fiber_tags %}{% show_content "plain" %}', '<div class="content"><p>plain</p></div>')
@@ -3,8 +3,10 @@ from django.test import TestCase
 from django.contrib.auth.models import User, AnonymousUser
 from django.urls import reverse
 
+import fiber.templatetags.fiber_tags
+
 from fiber.models import Page
-from ...test_util import RenderMixin
+from ...test_util import RenderMixin, condense_html_whitespace
 
 
 class BaseTestShowMenu(RenderMixin, TestCase):
@@ -507,6 +509,104 @@ class TestShowSitemap(BaseTestShowMenu):
                 })
 
 
+class TestShowMenuFromSnapshot(BaseTestShowMenu):
+    """
+    Menus built from the in-memory page tree snapshot
+    """
+    def setUp(self):
+        super().setUp()
+        self._local_cache = fiber.templatetags.fiber_tags.LOCAL_CACHE
+        self.staff = User.objects.create_user('staff', 'staff@example.com', password='staff')
+        self.staff.is_staff = True
+        self.staff.save()
+
+    def tearDown(self):
+        fiber.templatetags.fiber_tags.LOCAL_CACHE = self._local_cache
+
+    def render(self, local_cache, template, context):
+        fiber.templatetags.fiber_tags.LOCAL_CACHE = local_cache
+        return Template('{% load fiber_tags %}' + template).render(Context(context))
+
+    def test_same_as_database(self):
+        """Renders the same menus as the database"""
+        pages = [
+            None, self.main, self.home, self.about, self.mission, self.products, self.product_a, self.downloads,
+            self.manual, self.product_c, self.disclaimer
+        ]
+        menus = ['"main" 1 2', '"main" 2 3', '"main" 1 999 "all"', '"main" 2 999 "all_descendants"', '"main" 3 5', '"general" 1 2']
+        for page in pages:
+            for menu in menus:
+                for user in [self.anon, self.staff]:
+                    with self.subTest(page=page, menu=menu, user=user):
+                        template = '{%% show_menu %s %%}' % menu
+                        context = {'user': user, 'fiber_page': page}
+                        self.assertEqual(self.render(False, template, context), self.render(True, template, context))
+
+    def test_no_queries(self):
+        """Doesn't query the database once the snapshot is built"""
+        Page.objects.get_tree_snapshot()
+        with self.assertNumQueries(0):
+            self.render(True, '{% show_menu "main" 1 2 %}{% show_menu "main" 2 4 %}{% show_menu "general" 1 2 "all" %}', {
+                'user': self.anon,
+                'fiber_page': self.downloads
+            })
+
+    def test_snapshot_is_rebuilt_on_changes(self):
+        """Changes to the page tree show up in the menu"""
+        self.assertNotIn('jobs', self.render(True, '{% show_menu "main" 1 1 %}', {'user': self.anon}))
+        Page.objects.create(title='jobs', parent=self.main, url='jobs')
+        self.assertIn('jobs', self.render(True, '{% show_menu "main" 1 1 %}', {'user': self.anon}))
+
+    def test_show_non_existing_menu(self):
+        with self.assertRaises(Page.DoesNotExist):
+            self.render(True, '{% show_menu "missing" 1 999 %}', {})
+
+
+class TestShowMenuCache(BaseTestShowMenu):
+    """
+    Rendered menus are cached
+    """
+    def setUp(self):
+        super().setUp()
+        self._menu_cache = fiber.templatetags.fiber_tags.MENU_CACHE
+        fiber.templatetags.fiber_tags.MENU_CACHE = True
+        self.staff = User.objects.create_user('staff', 'staff@example.com', password='staff')
+        self.staff.is_staff = True
+        self.staff.save()
+
+    def tearDown(self):
+        fiber.templatetags.fiber_tags.MENU_CACHE = self._menu_cache
+
+    def render(self, template, context):
+        return Template('{% load fiber_tags %}' + template).render(Context(context))
+
+    def test_cached(self):
+        """The second render doesn't query the database"""
+        context = {'user': self.anon, 'fiber_page': self.products, 'fiber_current_pages': [self.products]}
+        menu = self.render('{% show_menu "main" 1 2 %}', context)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render('{% show_menu "main" 1 2 %}', context), menu)
+        self.assertIn('<li class="products current">', condense_html_whitespace(menu))
+
+    def test_cache_key(self):
+        """Menus are cached per page, current pages and staff user"""
+        menu = self.render('{% show_menu "main" 1 2 %}', {'user': self.anon, 'fiber_page': self.products})
+        self.assertNotEqual(
+            self.render('{% show_menu "main" 1 2 %}', {'user': self.anon, 'fiber_page': self.about}), menu)
+        self.assertNotEqual(
+            self.render('{% show_menu "main" 1 2 %}', {
+                'user': self.anon, 'fiber_page': self.products, 'fiber_current_pages': [self.products]
+            }), menu)
+        self.assertIn('data-fiber-data', self.render('{% show_menu "main" 1 2 %}', {'user': self.staff, 'fiber_page': self.products}))
+        self.assertEqual(self.render('{% show_menu "main" 1 2 %}', {'user': self.anon, 'fiber_page': self.products}), menu)
+
+    def test_invalidated_on_page_changes(self):
+        """Changes to the page tree show up in the menu"""
+        self.assertNotIn('jobs', self.render('{% show_menu "main" 1 1 %}', {'user': self.anon}))
+        Page.objects.create(title='jobs', parent=self.main, url='jobs')
+        self.assertIn('jobs', self.render('{% show_menu "main" 1 1 %}', {'user': self.anon}))
+
+
 class TestEdgeCases(TestCase):
     def test_show_non_existing_menu(self):
         """Rendering a non-existing menu raises a specific Page.DoesNotExist exception"""
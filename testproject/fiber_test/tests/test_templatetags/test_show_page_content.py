@@ -1,6 +1,6 @@
 from django.contrib.auth.models import User
 from django.template import Template, Context, TemplateSyntaxError
-from django.test import TestCase, SimpleTestCase
+from django.test import RequestFactory, TestCase, SimpleTestCase
 from django.urls import reverse
 
 from fiber.models import Page, ContentItem, PageContentItem
@@ -42,6 +42,17 @@ class TestShowPageContent(RenderMixin, TestCase):
                 'edit_url_home_content': reverse('fiber_admin:fiber_contentitem_change', args=[self.home_content.pk])
             }, {'fiber_page': self.home, 'user': self.staff})
 
+    def test_show_page_content_queries(self):
+        """All blocks of a page are retrieved in one query"""
+        sidebar = ContentItem.objects.create(content_html='<p>sidebar</p>')
+        PageContentItem.objects.create(content_item=sidebar, page=self.home, block_name='sidebar')
+        home = Page.objects.get(pk=self.home.pk)
+        with self.assertNumQueries(1):
+            self.assertRendered(
+                '{% load fiber_tags %}{% show_page_content "main" %}{% show_page_content "sidebar" %}{% show_page_content "footer" %}',
+                '<div><div class="content"><p>homepage</p></div></div><div><div class="content"><p>sidebar</p></div></div><div></div>',
+                {'fiber_page': home})
+
     def test_show_page_content_with_other(self):
         """The show_page_content templatetag should support rendering content from multiple pages in one view."""
         self.assertRendered(
@@ -86,6 +97,17 @@ class TestShowPageContent(RenderMixin, TestCase):
             '<div><div class="content"><p>about</p></div></div>',
             {'fiber_page': self.home, 'about_page': self.about, 'main': 'main'})
 
+    def test_request_fiber_page(self):
+        """
+        Falls back to request.fiber_page, which FiberPageMiddleware adds
+        """
+        request = RequestFactory().get('/')
+        request.fiber_page = self.home
+        self.assertRendered(
+            '{% load fiber_tags %}{% show_page_content "main" %}',
+            '<div><div class="content"><p>homepage</p></div></div>',
+            {'request': request})
+
     def test_on_non_fiber_page(self):
         """
         show_page_content on a non fiber page
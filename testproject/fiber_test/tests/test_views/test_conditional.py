@@ -0,0 +1,176 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import renderers
+
+import fiber.views
+
+from fiber.cache import get_cache
+from fiber.models import Page, ContentItem, PageContentItem
+from fiber.rest_api.views import PageTree, PlainText
+
+
+class TestConditionalGet(TestCase):
+    """The admin data endpoints answer If-None-Match with 304 until the data changes"""
+    def setUp(self):
+        self.home = Page.objects.create(title='home', url='/')
+        self.staff = User.objects.create_user('staff', 'staff@example.com', password='staff')
+        self.staff.is_staff = True
+        self.staff.save()
+        self.client.force_login(self.staff)
+
+    def assertConditional(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_pagetree(self):
+        self.assertConditional('/api/v2/pagetree/', lambda: Page.objects.create(title='about', parent=self.home))
+
+    def test_pagetree_level(self):
+        url = '/api/v2/pagetree/?node=%s' % self.home.id
+        self.assertConditional(url, lambda: Page.objects.create(title='about', parent=self.home))
+        self.assertNotEqual(self.client.get(url)['ETag'], self.client.get('/api/v2/pagetree/')['ETag'])
+
+    def test_contentitemgroups(self):
+        self.assertConditional('/api/v2/contentitemgroups/', lambda: ContentItem.objects.create(name='new'))
+
+    def test_pages_json(self):
+        self.assertConditional(reverse('pages_json'), lambda: Page.objects.create(title='about', parent=self.home))
+
+    def test_per_user(self):
+        """By default every user has a scope of their own"""
+        other = User.objects.create_user('other', 'other@example.com', password='other')
+        other.is_staff = True
+        other.save()
+        etag = self.client.get('/api/v2/pagetree/')['ETag']
+        self.client.force_login(other)
+        self.assertNotEqual(self.client.get('/api/v2/pagetree/')['ETag'], etag)
+
+    def test_renderers(self):
+        """Every renderer has an ETag of its own"""
+        renderer_classes = PageTree.renderer_classes
+        PageTree.renderer_classes = (renderers.JSONRenderer, PlainText)
+        try:
+            response = self.client.get('/api/v2/pagetree/', HTTP_ACCEPT='application/json')
+            self.assertIn('Accept', response['Vary'])
+            response = self.client.get(
+                '/api/v2/pagetree/', HTTP_ACCEPT='text/plain', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        finally:
+            PageTree.renderer_classes = renderer_classes
+
+    def test_invalid_parameters(self):
+        """Invalid requests aren't answered with 304"""
+        for url in ['/api/v2/pagetree/?node=x', '/api/v2/contentitemgroups/?group=x']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertNotIn('ETag', response)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 400)
+
+class TestConditionalPages(TestCase):
+    """FIBER_CONDITIONAL_PAGES answers conditional requests for pages before they are rendered"""
+    def setUp(self):
+        self._conditional_pages = fiber.views.CONDITIONAL_PAGES
+        fiber.views.CONDITIONAL_PAGES = True
+
+        self.home = Page.objects.create(title='home', url='/')
+        self.about = Page.objects.create(title='about', url='about', parent=self.home)
+        self.content_item = ContentItem.objects.create(content_html='<p>home</p>')
+        self.page_content_item = PageContentItem.objects.create(
+            page=self.home, content_item=self.content_item, block_name='main')
+
+    def tearDown(self):
+        fiber.views.CONDITIONAL_PAGES = self._conditional_pages
+
+    def assertConditional(self, change):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # - only the page is retrieved, and the time its content items were updated
+        with self.assertNumQueries(3):
+            response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        change()
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_content_item_changed(self):
+        def change():
+            self.content_item.content_html = '<p>changed</p>'
+            self.content_item.save()
+        self.assertConditional(change)
+
+    def test_content_item_removed(self):
+        self.assertConditional(lambda: self.page_content_item.delete())
+
+    def test_named_content_item_changed(self):
+        """Content items of show_content tags"""
+        self.home.template_name = 'page_cache.html'
+        self.home.save()
+        footer = ContentItem.objects.create(name='footer', content_html='<p>footer</p>')
+
+        def change():
+            footer.content_html = '<p>changed footer</p>'
+            footer.save()
+        self.assertConditional(change)
+        self.assertContains(self.client.get('/'), '<p>changed footer</p>')
+
+    def test_named_content_item_changed_with_page_cache(self):
+        page_cache = fiber.views.PAGE_CACHE
+        fiber.views.PAGE_CACHE = True
+        try:
+            get_cache().clear()
+            self.home.template_name = 'page_cache.html'
+            self.home.save()
+            footer = ContentItem.objects.create(name='footer', content_html='<p>footer</p>')
+            etag = self.client.get('/')['ETag']
+
+            footer.content_html = '<p>changed footer</p>'
+            footer.save()
+            response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+            self.assertContains(response, '<p>changed footer</p>')
+            self.assertNotEqual(response['ETag'], etag)
+        finally:
+            fiber.views.PAGE_CACHE = page_cache
+
+    def test_page_tree_changed(self):
+        self.assertConditional(lambda: Page.objects.create(title='contact', url='contact', parent=self.home))
+
+    def test_if_modified_since(self):
+        response = self.client.get('/')
+        response = self.client.get('/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_for_staff(self):
+        staff = User.objects.create_user('staff', 'staff@example.com', password='staff')
+        staff.is_staff = True
+        staff.save()
+        self.client.force_login(staff)
+        self.assertNotIn('ETag', self.client.get('/'))
+
+    def test_page_cache(self):
+        """Cached pages answer conditional requests without queries"""
+        page_cache = fiber.views.PAGE_CACHE
+        fiber.views.PAGE_CACHE = True
+        try:
+            get_cache().clear()
+            etag = self.client.get('/')['ETag']
+            with self.assertNumQueries(0):
+                response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        finally:
+            fiber.views.PAGE_CACHE = page_cache
@@ -2,6 +2,7 @@ from django.contrib.auth.models import User
 from django.test import TestCase, RequestFactory
 from django.test.utils import override_settings
 
+import fiber.managers
 from fiber.models import Page, ContentItem, PageContentItem
 from fiber.views import FiberTemplateView
 
@@ -68,6 +69,19 @@ class TestFiberTemplateView(TestCase):
         Page.objects.create(title='redirect', url='/redirect/', redirect_page=self.frontpage)
         self.assertRedirects(self.client.get('/redirect/'), self.frontpage.url, 301)
 
+    def test_redirect_page_from_redirect_map(self):
+        """Redirects without queries with the local cache"""
+        local_cache = fiber.managers.LOCAL_CACHE
+        fiber.managers.LOCAL_CACHE = True
+        try:
+            Page.objects.create(title='redirect', url='/redirect/', redirect_page=self.frontpage)
+            Page.objects.get_redirect_map()
+            with self.assertNumQueries(0):
+                response = self.client.get('/redirect/')
+            self.assertRedirects(response, self.frontpage.url, 301)
+        finally:
+            fiber.managers.LOCAL_CACHE = local_cache
+
     def test_redirect_to_self(self):
         """Does not redirect to self"""
         page = Page.objects.create(title='redirect loop', url='/redirect-loop/')
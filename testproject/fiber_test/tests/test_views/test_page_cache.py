@@ -0,0 +1,110 @@
+from django.contrib.auth.models import User
+from django.contrib.messages import constants
+from django.contrib.messages.storage.base import Message
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+import fiber.views
+
+from fiber.cache import get_cache
+from fiber.models import Page, ContentItem, PageContentItem
+
+
+class TestPageCache(TestCase):
+    """FIBER_PAGE_CACHE caches pages for anonymous users until the pages or the content they show change"""
+    def setUp(self):
+        self._page_cache = fiber.views.PAGE_CACHE
+        fiber.views.PAGE_CACHE = True
+        get_cache().clear()
+
+        self.home = Page.objects.create(title='home', url='/', template_name='page_cache.html')
+        self.about = Page.objects.create(title='about', url='about', parent=self.home, template_name='page_cache.html')
+        self.home_content = ContentItem.objects.create(content_html='<p>home</p>')
+        PageContentItem.objects.create(page=self.home, content_item=self.home_content, block_name='main')
+        self.about_content = ContentItem.objects.create(content_html='<p>about</p>')
+        PageContentItem.objects.create(page=self.about, content_item=self.about_content, block_name='main')
+
+    def tearDown(self):
+        fiber.views.PAGE_CACHE = self._page_cache
+
+    def test_cached(self):
+        response = self.client.get('/')
+        self.assertContains(response, '<p>home</p>')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertContains(response, '<p>home</p>')
+        self.assertContains(response, '<title>home</title>')
+
+    def test_content_item_changed(self):
+        self.client.get('/')
+        self.client.get('/about/')
+        self.home_content.content_html = '<p>changed</p>'
+        self.home_content.save()
+
+        # - only the page that shows the content item is built again
+        with self.assertNumQueries(0):
+            self.client.get('/about/')
+        self.assertContains(self.client.get('/'), '<p>changed</p>')
+
+    def test_page_content_item_added(self):
+        self.client.get('/')
+        self.client.get('/about/')
+        PageContentItem.objects.create(page=self.home, content_item=self.about_content, block_name='main')
+
+        with self.assertNumQueries(0):
+            self.client.get('/about/')
+        self.assertContains(self.client.get('/'), '<p>about</p>')
+
+    def test_named_content_item(self):
+        self.client.get('/')
+        # - creating the content item of a show_content tag
+        footer = ContentItem.objects.create(name='footer', content_html='<p>footer</p>')
+        self.assertContains(self.client.get('/'), '<p>footer</p>')
+        # - changing it
+        footer.content_html = '<p>changed footer</p>'
+        footer.save()
+        self.assertContains(self.client.get('/'), '<p>changed footer</p>')
+
+    def test_page_changed(self):
+        """Menus show all pages, so any change to a page builds all pages again"""
+        self.client.get('/')
+        self.client.get('/about/')
+        self.home.title = 'changed'
+        self.home.save()
+        self.assertContains(self.client.get('/'), '<title>changed</title>')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/about/')
+        self.assertTrue(queries)
+
+    def test_not_cached_for_staff(self):
+        staff = User.objects.create_user('staff', 'staff@example.com', password='staff')
+        staff.is_staff = True
+        staff.save()
+        self.client.force_login(staff)
+        self.client.get('/')
+        ContentItem.objects.filter(pk=self.home_content.pk).update(content_html='<p>changed</p>')
+        self.assertContains(self.client.get('/'), '<p>changed</p>')
+
+    def test_query_string(self):
+        self.client.get('/')
+        ContentItem.objects.filter(pk=self.home_content.pk).update(content_html='<p>changed</p>')
+        self.assertContains(self.client.get('/?page=2'), '<p>changed</p>')
+        self.assertContains(self.client.get('/'), '<p>home</p>')
+
+    def test_csrf_token(self):
+        """Pages with a CSRF token aren't cached"""
+        Page.objects.create(title='form', url='form', parent=self.home, template_name='page_cache_csrf.html')
+        self.client.get('/form/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/form/')
+        self.assertTrue(queries)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_messages(self):
+        """Pages that show messages aren't cached"""
+        storage = CookieStorage(RequestFactory().get('/'))
+        self.client.cookies['messages'] = storage._encode([Message(constants.INFO, 'Hello')])
+        self.assertContains(self.client.get('/'), '<p class="message">Hello</p>')
+        self.assertNotContains(self.client.get('/'), 'Hello')